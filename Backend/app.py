@@ -1,10 +1,22 @@
 import streamlit as st
 import requests
-import os
 import time
+import json
 
 API_URL = "http://localhost:8000"  # FastAPI backend base URL
 
+def iter_sse(response):
+    """Yield (event, data) pairs from a streaming server-sent-event response"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = "message", []
+
 # Configure page
 st.set_page_config(
     page_title="AI Document Assistant", 
@@ -269,32 +281,28 @@ with col2:
 
 if uploaded_file is not None:
     with st.spinner("⚙️ Processing document and initializing AI analysis..."):
-        # Save the uploaded file to a fixed path
-        UPLOAD_DIR = r"D:\GenAI\Backend\uploads"
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        file_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
-
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.read())
+        # Re-uploading a file name from this session uploads a new revision of that document
+        uploaded_documents = st.session_state.setdefault("uploaded_documents", {})
+        data = {}
+        if uploaded_file.name in uploaded_documents:
+            data["replaces"] = uploaded_documents[uploaded_file.name]
 
-        # Upload to FastAPI backend
-        with open(file_path, "rb") as f:
-            response = requests.post(f"{API_URL}/upload/", files={"file": f})
+        # Upload to FastAPI backend; the backend stores it under its content hash
+        response = requests.post(f"{API_URL}/upload/", files={"file": (uploaded_file.name, uploaded_file.getvalue())}, data=data)
 
     if response.status_code == 200:
+        st.session_state.document_id = response.json().get("document_id")
+        uploaded_documents[uploaded_file.name] = st.session_state.document_id
         st.markdown("""
         <div class="success-box">
             ✅ Document uploaded and processed successfully
         </div>
         """, unsafe_allow_html=True)
 
-        # Extract summary after upload
-        with st.spinner("🤖 Generating comprehensive AI summary..."):
-            extract_res = requests.get(f"{API_URL}/upload/")
+        # Stream the summary after upload: chunk summaries appear as they finish
+        extract_res = requests.get(f"{API_URL}/upload/stream", params={"document_id": st.session_state.document_id}, stream=True)
             
         if extract_res.status_code == 200:
-            summary_data = extract_res.json()
-            
             # Display metrics
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -317,11 +325,25 @@ if uploaded_file is not None:
                 )
             
             st.markdown("### 📋 Executive Summary")
-            st.markdown(f"""
-            <div class="answer-box">
-                <p>{summary_data['summary']}</p>
-            </div>
-            """, unsafe_allow_html=True)
+            progress = st.progress(0.0, text="🤖 Generating comprehensive AI summary...")
+            summary_box = st.empty()
+            for event, data in iter_sse(extract_res):
+                if event == "map":
+                    progress.progress(data["done"] / data["total"], text=f"🤖 Summarized {data['done']} of {data['total']} sections...")
+                    summary_box.markdown(f"""
+                    <div class="answer-box">
+                        <p><em>{data['summary']}</em></p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                elif event == "reduce":
+                    progress.progress(1.0, text=f"🤖 Combining {data['parts']} partial summaries...")
+                elif event == "summary":
+                    progress.empty()
+                    summary_box.markdown(f"""
+                    <div class="answer-box">
+                        <p>{data['summary']}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
         else:
             st.markdown("""
             <div class="error-box">
@@ -368,14 +390,10 @@ if ask_button:
         </div>
         """, unsafe_allow_html=True)
     else:
-        with st.spinner("� AI is analyzing your query..."):
-            start_time = time.time()
-            res = requests.post(f"{API_URL}/askanything/", json={"question": question})
-            end_time = time.time()
+        start_time = time.time()
+        res = requests.post(f"{API_URL}/askanything/stream", json={"question": question, "document_id": st.session_state.get("document_id")}, stream=True)
             
         if res.status_code == 200:
-            data = res.json()
-            
             st.markdown(f"""
             <div class="question-box">
                 <h4>❓ Query Submitted:</h4>
@@ -383,16 +401,31 @@ if ask_button:
             </div>
             """, unsafe_allow_html=True)
             
-            st.markdown(f"""
-            <div class="answer-box">
-                <h4>🧠 AI Analysis Result:</h4>
-                <p>{data['answer']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            
-            with st.expander("📌 View Detailed Analysis & Source References", expanded=False):
-                st.markdown(data['justification'])
+            # Filled in as events arrive: sources, then the answer, then the justification
+            answer_box = st.empty()
+            answer_box.info("🔍 AI is analyzing your query...")
+            justification_box = st.empty()
+            for event, data in iter_sse(res):
+                if event == "sources":
+                    sections = ", ".join(f"{source['section']} (¶{source['paragraph_number']})" for source in data["sources"])
+                    answer_box.info(f"📖 Reading {sections}...")
+                elif event == "answer":
+                    answer_box.markdown(f"""
+                    <div class="answer-box">
+                        <h4>🧠 AI Analysis Result:</h4>
+                        <p>{data['answer']}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                elif event == "justification":
+                    with justification_box.expander("📌 View Detailed Analysis & Source References", expanded=False):
+                        st.markdown(data['justification'])
+                elif event == "error":
+                    answer_box.markdown(f"""
+                    <div class="error-box">
+                        ❌ Server busy. Please try again in {data['retry_after']} seconds.
+                    </div>
+                    """, unsafe_allow_html=True)
+            end_time = time.time()
                 
         else:
             st.markdown("""
@@ -427,11 +460,12 @@ with col2:
 if generate_button:
     with st.spinner("🤖 Generating personalized assessment questions..."):
         start_time = time.time()
-        response = requests.get(f"{API_URL}/challenge/")
+        response = requests.get(f"{API_URL}/challenge/", params={"document_id": st.session_state.get("document_id")})
         end_time = time.time()
         
     if response.status_code == 200:
         st.session_state.questions = response.json()["questions"]
+        st.session_state.num_questions = response.json().get("num_questions")
         st.session_state.user_answers = [""] * len(st.session_state.questions)
         
         st.markdown("""
@@ -470,7 +504,9 @@ if "questions" in st.session_state:
 
     if submit_button:
         with st.spinner("🔍 Evaluating your responses..."):
-            payload = {"user_answers": st.session_state.user_answers}
+            payload = {"user_answers": st.session_state.user_answers, "document_id": st.session_state.get("document_id")}
+            if st.session_state.get("num_questions"):
+                payload["num_questions"] = st.session_state.num_questions  # which challenge is being answered
             eval_res = requests.post(f"{API_URL}/challenge/", json=payload)
             
         if eval_res.status_code == 200:
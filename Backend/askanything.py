@@ -1,183 +1,567 @@
-from upload import get_extracted_text 
-from typing import List, Dict
+from upload import iter_document_pages
+from documents import CACHE_DIR
+from chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, iter_chunks
+from typing import List, Dict, Iterator
 import logging
 import time
+import json
+import hashlib
 import os
-from sentence_transformers import SentenceTransformer
+from collections import Counter
+from embedding_service import EMBEDDING_MODEL_ID, get_encoder, encode, get_cache_stats
+from models import ModelHandle
+from inference import optimize_qa_pipeline
+from workers import MicroBatcher
+from sparse_index import BM25Index, build_bm25_index
 import faiss
 import numpy as np
-from transformers import pipeline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load models once at module level
-try:
-    logger.info("Loading SentenceTransformer model...")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    logger.info("SentenceTransformer model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load SentenceTransformer model: {e}")
-    model = None
-
-try:
-    logger.info("Loading QA pipeline...")
-    qa_pipeline = pipeline("question-answering", model="distilbert-base-uncased-distilled-squad")
-    logger.info("QA pipeline loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load QA pipeline: {e}")
-    qa_pipeline = None
-
-# Cache for document embeddings and indices
-document_cache = {}
-MAX_CACHE_SIZE = 10
-
-def get_document_cache_key():
-    """Generate cache key for current document"""
-    import state
-    if not state.uploaded_file_path or not os.path.exists(state.uploaded_file_path):
+INDEX_DIR = os.path.join(CACHE_DIR, "indexes")
+
+# Index factory settings ("auto" picks by corpus size)
+INDEX_TYPE = "auto"  # "flat", "hnsw", "ivfpq" or "auto"
+HNSW_MIN_VECTORS = 20000
+IVFPQ_MIN_VECTORS = 200000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+PQ_SUBQUANTIZERS = 48  # must divide the embedding dimension (384)
+TRAIN_SAMPLE_SIZE = 100000
+
+# Retrieval: dense (FAISS), sparse (BM25) or hybrid (reciprocal-rank fusion of both)
+RETRIEVAL_MODE = "hybrid"
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+HYBRID_CANDIDATES = 20  # results taken from each retriever before fusion
+RRF_K = 60
+
+QA_MODEL_NAME = "distilbert-base-uncased-distilled-squad"
+
+def load_qa_pipeline():
+    from transformers import pipeline
+    return optimize_qa_pipeline(pipeline("question-answering", model=QA_MODEL_NAME), QA_MODEL_NAME)
+
+# Loaded on first use or by the warm-up in main.py (embeddings come from the shared embedding service)
+qa_handle = ModelHandle("qa", load_qa_pipeline)
+
+def iter_structured_chunks(pages) -> Iterator[Dict]:
+    """Yield token-bounded paragraph chunks from an iterable of page texts as they arrive"""
+    encoder = get_encoder()
+    tokenizer = encoder.tokenizer if encoder else None
+    yield from iter_chunks(pages, tokenizer)
+
+def parse_document_with_structure(text: str) -> List[Dict]:
+    return list(iter_structured_chunks([text]))
+
+ENCODE_BATCH_SIZE = 256
+
+def choose_index_type(num_vectors):
+    """Exact search for small documents, graph / compressed ANN as the corpus grows"""
+    if num_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if num_vectors >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+def configure_index(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Apply query-time recall/latency knobs to an index (no-op for flat indexes)"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = nprobe
+    return index
+
+def read_mapped_index(path):
+    """
+    Open a persisted FAISS index with its vectors memory-mapped read-only.
+
+    IO_FLAG_MMAP_IFC maps flat, HNSW and IVF storage alike (IO_FLAG_MMAP
+    only covers IVF inverted lists), so every worker process shares the
+    page cache instead of holding its own copy. The mapped index must not
+    be modified: use copy_index to get a writable one.
+    """
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+def copy_index(index):
+    """A writable in-memory copy of an index (clone_index would share a mapped index's storage)"""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+def build_index(embeddings, ids=None, index_type=INDEX_TYPE):
+    """
+    Build a FAISS index over an embedding matrix.
+
+    "flat" is exact brute force, "hnsw" a graph index for tens of thousands
+    of chunks, "ivfpq" an inverted-file index with product quantization for
+    very large corpora (trained on a random sample). "auto" chooses by size.
+    Vectors are stored under `ids` (chunk IDs) in an IndexIDMap2 so single
+    chunks can later be removed or added; without ids they are numbered 0..n-1.
+    """
+    num_vectors, dim = embeddings.shape
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, PQ_SUBQUANTIZERS, 8)
+        sample_size = min(num_vectors, max(TRAIN_SAMPLE_SIZE, 39 * nlist))
+        sample = embeddings[np.random.default_rng(0).choice(num_vectors, sample_size, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    if ids is None:
+        ids = np.arange(num_vectors, dtype=np.int64)
+    index = faiss.IndexIDMap2(index)
+    index.add_with_ids(embeddings, ids)
+    logger.info(f"Built {index_type} index over {num_vectors} vectors")
+    return configure_index(index)
+
+def get_chunk_ids(structured_chunks):
+    """
+    Stable 63-bit ID for each chunk, derived from its text.
+
+    Repeated texts are told apart by occurrence number, so an unchanged
+    paragraph keeps its ID (and its vector) across document revisions even
+    when its section or paragraph number shifts.
+    """
+    seen = Counter()
+    ids = []
+    for chunk in structured_chunks:
+        occurrence = seen[chunk["text"]]
+        seen[chunk["text"]] += 1
+        digest = hashlib.sha1(f"{occurrence}\0{chunk['text']}".encode("utf-8")).hexdigest()
+        ids.append(int(digest[:15], 16))
+    return np.array(ids, dtype=np.int64)
+
+def set_session_index(session, structured_chunks, embeddings, index, sparse_index=None):
+    """Attach the dense and sparse indexes to a session along with the chunk ID -> position lookup"""
+    if isinstance(index, faiss.IndexIDMap) and structured_chunks and "chunk_id" in structured_chunks[0]:
+        session.chunk_positions = {chunk["chunk_id"]: i for i, chunk in enumerate(structured_chunks)}
+    else:
+        # Indexes persisted before chunk IDs were introduced use positions as IDs
+        session.chunk_positions = {i: i for i in range(len(structured_chunks))}
+    session.structured_chunks = structured_chunks
+    session.embeddings = embeddings
+    # Indexes persisted before BM25 was added get theirs built here
+    session.sparse_index = sparse_index if sparse_index is not None else build_bm25_index([chunk["text"] for chunk in structured_chunks])
+    session.index = index
+
+def get_index_paths(document_id, model_name=EMBEDDING_MODEL_ID):
+    """On-disk index, embedding matrix, chunk list and BM25 index for a document, embedding model and chunking setup"""
+    chunking = f"c{CHUNK_MAX_TOKENS}-{CHUNK_OVERLAP_TOKENS}"
+    base = os.path.join(INDEX_DIR, f"{document_id}_{model_name.replace('/', '--')}_{chunking}")
+    return base + ".faiss", base + ".npy", base + ".chunks.json", base + ".bm25.npz"
+
+def save_document_index(document_id, structured_chunks, embeddings, index, sparse_index):
+    """Persist a document index; each file is written to a temp name then renamed"""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    index_path, embeddings_path, chunks_path, sparse_path = get_index_paths(document_id)
+
+    with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(structured_chunks, f)
+    os.replace(chunks_path + ".tmp", chunks_path)
+
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, embeddings)
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+
+    sparse_index.save(sparse_path)
+
+    # The index is written last, so its presence marks a complete entry
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+
+def load_document_index(document_id):
+    """
+    Memory-map a persisted document index.
+
+    Returns (structured_chunks, embeddings, index, sparse_index) or None if
+    the document has not been indexed with the current embedding model. The
+    FAISS index is opened with read_mapped_index and the embedding matrix
+    with np.load mmap_mode, so every worker shares one copy of the pages.
+    sparse_index is None for indexes persisted without one.
+    """
+    index_path, embeddings_path, chunks_path, sparse_path = get_index_paths(document_id)
+    if not os.path.exists(index_path):
         return None
-    
+
     try:
-        stat = os.stat(state.uploaded_file_path)
-        return f"{state.uploaded_file_path}_{stat.st_mtime}_{stat.st_size}"
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            structured_chunks = json.load(f)
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        index = read_mapped_index(index_path)
+        sparse_index = BM25Index.load(sparse_path) if os.path.exists(sparse_path) else None
+        return structured_chunks, embeddings, configure_index(index), sparse_index
     except Exception as e:
-        logger.error(f"Error getting document cache key: {e}")
+        logger.error(f"Error loading persisted document index: {e}")
         return None
 
-def cleanup_document_cache():
-    """Clean up old cache entries"""
-    if len(document_cache) > MAX_CACHE_SIZE:
-        
-        items = list(document_cache.items())
-        document_cache.clear()
-        document_cache.update(items[-MAX_CACHE_SIZE:])
-
-def parse_document_with_structure(text: str) -> List[Dict]:
-    lines = text.split('\n')
-    structured_chunks = []
-    current_section = None
-    paragraph_count = 0
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Check if the line is a section header like "2.1 Methods"
-        if line[0].isdigit() and '.' in line[:5]:
-            current_section = line
-            paragraph_count = 0
-            continue
-        
-        # Otherwise, treat it as a paragraph
-        paragraph_count += 1
-        structured_chunks.append({
-            "section": current_section,
-            "paragraph_number": paragraph_count,
-            "text": line
-        })
-    
-    return structured_chunks
-# Initialize global variables (legacy compatibility)
-structured_chunks = []
-index = None
-
-def initialize_document_index():
-    """Initialize the document index when a file is uploaded"""
-    global structured_chunks, index
-    
-    if not model:
+def initialize_document_index(session):
+    """Build (or load from disk) the chunk list and FAISS index for a document session"""
+    if get_encoder() is None:
         logger.error("SentenceTransformer model not available")
         return False
     
-    
-    cache_key = get_document_cache_key()
-    if not cache_key:
-        return False
-    
-    
-    if cache_key in document_cache:
-        logger.info("Document index cache hit")
-        cached_data = document_cache[cache_key]
-        structured_chunks = cached_data["structured_chunks"]
-        index = cached_data["index"]
-        return True
-    
-    
-    start_time = time.time()
-    document_text = get_extracted_text()
-    if document_text == "No file uploaded yet." or document_text.startswith("Error"):
-        return False
-    
-    structured_chunks = parse_document_with_structure(document_text)
-    texts = [chunk["text"] for chunk in structured_chunks]
-    
-    if not texts:
-        return False
-    
-    try:
-        # Create embeddings
-        embeddings = model.encode(texts)
-        index = faiss.IndexFlatL2(embeddings[0].shape[0])
-        index.add(np.array(embeddings))
+    with session.lock:
+        if session.index is not None:
+            logger.info("Document index cache hit")
+            return True
         
-        # Cache the results
-        document_cache[cache_key] = {
-            "structured_chunks": structured_chunks,
-            "index": index
-        }
-        cleanup_document_cache()
+        start_time = time.time()
         
-        end_time = time.time()
-        logger.info(f"Document index created and cached in {end_time - start_time:.2f} seconds")
-        return True
+        persisted = load_document_index(session.document_id)
+        if persisted is not None:
+            set_session_index(session, *persisted)
+            end_time = time.time()
+            logger.info(f"Document index loaded from disk in {end_time - start_time:.2f} seconds")
+            return True
         
-    except Exception as e:
-        logger.error(f"Error creating document index: {e}")
-        return False
+        structured_chunks = []
+        embedding_batches = []
+        index = None
+        pending = []
+        
+        try:
+            # Embed chunks in batches while later pages are still being extracted
+            for chunk in iter_structured_chunks(iter_document_pages(session)):
+                structured_chunks.append(chunk)
+                pending.append(chunk["text"])
+                if len(pending) >= ENCODE_BATCH_SIZE:
+                    embedding_batches.append(encode(pending))
+                    pending = []
+            if pending:
+                embedding_batches.append(encode(pending))
+            
+            if not embedding_batches:
+                return False
+            
+            embeddings = np.vstack(embedding_batches)
+            chunk_ids = get_chunk_ids(structured_chunks)
+            for chunk, chunk_id in zip(structured_chunks, chunk_ids):
+                chunk["chunk_id"] = int(chunk_id)
+            index = build_index(embeddings, chunk_ids)
+            sparse_index = build_bm25_index([chunk["text"] for chunk in structured_chunks])
+            
+            try:
+                save_document_index(session.document_id, structured_chunks, embeddings, index, sparse_index)
+            except Exception as e:
+                logger.error(f"Error persisting document index: {e}")
+            
+            # Keep the results on the session
+            set_session_index(session, structured_chunks, embeddings, index, sparse_index)
+            
+            end_time = time.time()
+            logger.info(f"Document index created in {end_time - start_time:.2f} seconds (embedding cache: {get_cache_stats()})")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error creating document index: {e}")
+            return False
 
-def reset_document_index():
-    """Reset the document index when a new file is uploaded"""
-    global structured_chunks, index
-    structured_chunks = []
-    index = None
 
+def update_document_index(session, previous):
+    """
+    Build a revision's index by diffing its chunks against the previous revision.
 
-from transformers import pipeline
+    Only chunks whose text is new are encoded and added; chunks that
+    disappeared are removed with remove_ids. Indexes that cannot remove
+    vectors (HNSW) are rebuilt from the reused vectors without re-encoding.
+    Returns the number of chunks (added, removed), or None on failure.
+    """
+    if get_encoder() is None or not initialize_document_index(previous):
+        return None
+    
+    with session.lock:
+        start_time = time.time()
+        try:
+            structured_chunks = list(iter_structured_chunks(iter_document_pages(session)))
+            if not structured_chunks:
+                return None
+            
+            chunk_ids = get_chunk_ids(structured_chunks)
+            for chunk, chunk_id in zip(structured_chunks, chunk_ids):
+                chunk["chunk_id"] = int(chunk_id)
+            
+            previous_positions = previous.chunk_positions
+            current_ids = set(chunk_ids.tolist())
+            removed_ids = np.array([i for i in previous_positions if i not in current_ids], dtype=np.int64)
+            added = [i for i, chunk_id in enumerate(chunk_ids) if int(chunk_id) not in previous_positions]
+            
+            # Reuse vectors of unchanged chunks, encode only the new ones
+            embeddings = np.empty((len(structured_chunks), previous.embeddings.shape[1]), dtype=np.float32)
+            added_positions = set(added)
+            kept = [i for i in range(len(structured_chunks)) if i not in added_positions]
+            if kept:
+                embeddings[kept] = previous.embeddings[[previous_positions[int(chunk_ids[i])] for i in kept]]
+            if added:
+                embeddings[added] = encode([structured_chunks[i]["text"] for i in added])
+            
+            index = copy_index(previous.index)
+            try:
+                if len(removed_ids):
+                    index.remove_ids(removed_ids)
+                if added:
+                    index.add_with_ids(embeddings[added], chunk_ids[added])
+                configure_index(index)
+            except RuntimeError:
+                logger.info("Index type does not support removal - rebuilding from reused vectors")
+                index = build_index(embeddings, chunk_ids)
+            # Term statistics change with every chunk, so BM25 is rebuilt (no model involved)
+            sparse_index = build_bm25_index([chunk["text"] for chunk in structured_chunks])
+            
+            try:
+                save_document_index(session.document_id, structured_chunks, embeddings, index, sparse_index)
+            except Exception as e:
+                logger.error(f"Error persisting document index: {e}")
+            
+            set_session_index(session, structured_chunks, embeddings, index, sparse_index)
+            
+            end_time = time.time()
+            logger.info(f"Document index updated incrementally in {end_time - start_time:.2f} seconds "
+                        f"({len(added)} chunks added, {len(removed_ids)} removed)")
+            return len(added), len(removed_ids)
+            
+        except Exception as e:
+            logger.error(f"Error updating document index: {e}")
+            return None
 
-qa_pipeline = pipeline("question-answering", model="distilbert-base-uncased-distilled-squad")
+def search_positions(q_embeddings, session, k):
+    """Chunk positions of the dense top-k for each row of a query embedding matrix, best first"""
+    _, ids = session.index.search(np.asarray(q_embeddings, dtype=np.float32), min(k, len(session.structured_chunks)))
+    # ANN indexes pad missing results with -1
+    return [[session.chunk_positions[i] for i in row if i >= 0] for row in ids]
 
-def get_answer_with_justification(question: str, k=3):
-    
-    if index is None:
-        if not initialize_document_index():
-            return "Please upload a document first.", "No document available for processing."
+def search_chunks(q_embeddings, session, k=3):
+    """Top-k chunks for each row of a query embedding matrix, best first"""
+    if session.index is None:
+        if not initialize_document_index(session):
+            return [[] for _ in q_embeddings]
     
-    # Encode question and retrieve top-k chunks using FAISS
-    q_embedding = model.encode([question])
-    _, indices = index.search(np.array(q_embedding), k)
+    structured_chunks = session.structured_chunks
+    return [[structured_chunks[position] for position in row] for row in search_positions(q_embeddings, session, k)]
 
-    # Combine top-k chunk texts into a single context string
-    combined_context = "\n".join([structured_chunks[i]['text'] for i in indices[0]])
+def fuse_rankings(rankings, k, rrf_k=RRF_K):
+    """Reciprocal-rank fusion: score each item by the sum of 1 / (rrf_k + rank) over the rankings"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
 
+def search_questions(questions: List[str], q_embeddings, session, k=3, mode=None):
+    """
+    Top-k chunks for each question, best first, with the chosen retriever.
+
+    "dense" searches the FAISS index with q_embeddings, "sparse" the BM25
+    index with the question text (q_embeddings may be None), "hybrid" fuses
+    the top HYBRID_CANDIDATES of both with reciprocal-rank fusion.
+    Nothing is retrieved when dense retrieval gets no q_embeddings (the
+    encoder is not available).
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    if mode != "sparse" and q_embeddings is None:
+        return [[] for _ in questions]
+    if session.index is None:
+        if not initialize_document_index(session):
+            return [[] for _ in questions]
+    
+    if mode == "dense":
+        rankings = search_positions(q_embeddings, session, k)
+    elif mode == "sparse":
+        rankings = [session.sparse_index.search(question, k) for question in questions]
+    else:
+        candidates = max(k, HYBRID_CANDIDATES)
+        dense = search_positions(q_embeddings, session, candidates)
+        rankings = [
+            fuse_rankings([dense_ranking, session.sparse_index.search(question, candidates)], k)
+            for question, dense_ranking in zip(questions, dense)
+        ]
     
-    result = qa_pipeline(question=question, context=combined_context)
-    best_answer = result['answer']
+    structured_chunks = session.structured_chunks
+    return [[structured_chunks[position] for position in ranking] for ranking in rankings]
+
+def retrieve_chunks(question: str, session, k=3, mode=None):
+    """Top-k chunks for a question, best first"""
+    return retrieve_chunks_batch([question], session, k, mode)[0]
+
+def retrieve_chunks_batch(questions: List[str], session, k=3, mode=None):
+    """Top-k chunks for many questions: one encode call and one index.search over a query matrix"""
+    q_embeddings = None if (mode or RETRIEVAL_MODE) == "sparse" else encode(questions)
+    return search_questions(questions, q_embeddings, session, k, mode)
+
+def get_retrieval_signature(question: str, session, k=3, mode=None):
+    """What an answer depends on: the retrieved chunks' IDs, sections and paragraph numbers"""
+    return [(chunk.get("chunk_id"), chunk["section"], chunk["paragraph_number"]) for chunk in retrieve_chunks(question, session, k, mode)]
+
+
+QA_MAX_LENGTH = 384  # DistilBERT-SQuAD was fine-tuned on 384-token windows
+QA_MAX_ANSWER_TOKENS = 30
+QA_UNAVAILABLE = ("QA model not available.", "The question-answering model failed to load.")
+NO_MATCH = ("No passage in the document matches this question.", "Nothing was retrieved for the question; try rephrasing it or the dense or hybrid retrieval mode.")
+UNCACHEABLE_ANSWERS = (QA_UNAVAILABLE[0], NO_MATCH[0])  # transient or retriever-specific, never cached
+
+def extract_answers(pairs, qa_pipeline=None):
+    """
+    Extractive QA over (question, context) pairs in one padded forward pass.
 
-    # Use the top-1 chunk for justification metadata
-    top_index = indices[0][0]
-    best_chunk = structured_chunks[top_index]
+    Returns one {"answer", "score", "start", "end"} per pair, where score is
+    start logit + end logit of the best span inside the context (end after
+    start, at most QA_MAX_ANSWER_TOKENS long) and start/end are character
+    offsets into the context. Scores are comparable across pairs, so callers
+    can pick the best span over several chunks. `qa_pipeline` defaults to
+    the shared model.
+    """
+    import torch
 
-    justification = (
+    if qa_pipeline is None:
+        qa_pipeline = qa_handle.get()
+    tokenizer, qa_model = qa_pipeline.tokenizer, qa_pipeline.model
+    questions = [question for question, _ in pairs]
+    contexts = [context for _, context in pairs]
+    encoded = tokenizer(
+        questions, contexts,
+        truncation="only_second",
+        max_length=QA_MAX_LENGTH,
+        padding=True,
+        return_offsets_mapping=True,
+        return_tensors="pt",
+    )
+    offsets = encoded.pop("offset_mapping")
+    inputs = {name: tensor for name, tensor in encoded.items() if name in tokenizer.model_input_names}
+
+    with torch.inference_mode():
+        outputs = qa_model(**inputs)
+
+    # Only context tokens may be part of an answer
+    context_mask = torch.tensor(
+        [[sequence_id == 1 for sequence_id in encoded.sequence_ids(row)] for row in range(len(pairs))]
+    )
+    start_logits = outputs.start_logits.masked_fill(~context_mask, float("-inf"))
+    end_logits = outputs.end_logits.masked_fill(~context_mask, float("-inf"))
+
+    # Score every (start, end) span at once, keeping end >= start within the length limit
+    length = start_logits.shape[1]
+    span_scores = start_logits[:, :, None] + end_logits[:, None, :]
+    valid_spans = torch.ones(length, length, dtype=torch.bool).triu().tril(QA_MAX_ANSWER_TOKENS - 1)
+    span_scores = span_scores.masked_fill(~valid_spans, float("-inf"))
+    best_scores, best_flat = span_scores.view(len(pairs), -1).max(dim=1)
+
+    results = []
+    for row, (score, flat) in enumerate(zip(best_scores.tolist(), best_flat.tolist())):
+        start_token, end_token = divmod(flat, length)
+        start_char, end_char = offsets[row][start_token][0].item(), offsets[row][end_token][1].item()
+        results.append({
+            "answer": contexts[row][start_char:end_char],
+            "score": score,
+            "start": start_char,
+            "end": end_char
+        })
+    return results
+
+def answer_from_chunks(question: str, chunks):
+    """Best answer span across chunks; returns (answer, index of the chunk containing it)"""
+    results = extract_answers([(question, chunk["text"]) for chunk in chunks])
+    best = max(range(len(results)), key=lambda i: results[i]["score"])
+    return results[best]["answer"], best
+
+QA_BATCH_QUESTIONS = 8  # questions per QA forward pass in batch mode
+
+def format_justification(best_chunk, top_chunks):
+    """Markdown justification citing the chunk that contains the answer"""
+    combined_context = "\n".join([chunk['text'] for chunk in top_chunks])
+    return (
         f"📌 **Justification:**\n"
         f"- 🔢 Paragraph Number: {best_chunk['paragraph_number']}\n"
         f"- 📚 Section: {best_chunk['section']}\n"
         f"- 📄 Context used:\n\n{combined_context.strip()}"
     )
 
-    return best_answer, justification
+def get_empty_answer():
+    """Answer when nothing was retrieved: no match, unless retrieval itself is down (no encoder, so no index)"""
+    return NO_MATCH if get_encoder() is not None else QA_UNAVAILABLE
+
+def answer_with_justification(question: str, top_chunks):
+    """Answer a question from already retrieved chunks; returns (answer, justification)"""
+    if not top_chunks:
+        # e.g. BM25 when the question shares no term with the document
+        return get_empty_answer()
+    if qa_handle.get() is None:
+        return QA_UNAVAILABLE
+
+    # Run every chunk through the QA model as one batch and keep the best span
+    best_answer, best_position = answer_from_chunks(question, top_chunks)
+
+    # Justify with the chunk that actually contains the answer
+    return best_answer, format_justification(top_chunks[best_position], top_chunks)
+
+def get_answer_with_justification(question: str, session, k=3, mode=None):
+    
+    # Retrieve top-k chunks with the dense, sparse or hybrid retriever
+    top_chunks = retrieve_chunks(question, session, k, mode)
+    return answer_with_justification(question, top_chunks)
+
+def answer_retrieved_batch(questions: List[str], retrieved):
+    """
+    Answer questions from their retrieved chunks with one QA forward pass
+    over every (question, chunk) pair; returns [(answer, justification)].
+    """
+    if qa_handle.get() is None:
+        return [QA_UNAVAILABLE if top_chunks else get_empty_answer() for top_chunks in retrieved]
+
+    pairs = [(question, chunk["text"]) for question, top_chunks in zip(questions, retrieved) for chunk in top_chunks]
+    results = extract_answers(pairs) if pairs else []
+
+    answers = []
+    offset = 0
+    for top_chunks in retrieved:
+        if not top_chunks:
+            answers.append(get_empty_answer())
+            continue
+        scores = results[offset:offset + len(top_chunks)]
+        offset += len(top_chunks)
+        best_position = max(range(len(scores)), key=lambda j: scores[j]["score"])
+        answers.append((scores[best_position]["answer"], format_justification(top_chunks[best_position], top_chunks)))
+    return answers
+
+def iter_answers_with_justification(questions: List[str], session, k=3, batch_questions=QA_BATCH_QUESTIONS, mode=None):
+    """
+    Answer many questions against one document, yielding results as they finish.
+
+    All questions are encoded in one call and searched with one query
+    matrix; the QA model then runs over every (question, chunk) pair of
+    `batch_questions` questions per forward pass. Yields
+    (position, answer, justification) in input order.
+    """
+    retrieved = retrieve_chunks_batch(questions, session, k, mode)
+    
+    for start in range(0, len(questions), batch_questions):
+        end = min(start + batch_questions, len(questions))
+        answers = answer_retrieved_batch(questions[start:end], retrieved[start:end])
+        for position, (answer, justification) in enumerate(answers, start):
+            yield position, answer, justification
 
+def encode_question_batch(questions: List[str]):
+    """MicroBatcher batch function: one embedding row per question (None without an encoder)"""
+    embeddings = encode(questions)
+    return [None] * len(questions) if embeddings is None else list(embeddings)
 
+def answer_question_batch(items):
+    """MicroBatcher batch function: (question, top_chunks) items -> (answer, justification)"""
+    return answer_retrieved_batch([question for question, _ in items], [top_chunks for _, top_chunks in items])
 
+# Concurrent /askanything/ requests are coalesced into batched encode and QA calls
+question_batcher = MicroBatcher("question_encode", encode_question_batch)
+qa_batcher = MicroBatcher("qa", answer_question_batch, max_batch_size=QA_BATCH_QUESTIONS)
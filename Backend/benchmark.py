@@ -0,0 +1,610 @@
+"""
+Performance benchmarks for the GenAI Document Assistant backend.
+
+Usage:
+    python benchmark.py cache-hit [--size-mb 100] [--iterations 200]
+    python benchmark.py extraction path/to/document.pdf
+    python benchmark.py ann [--vectors 100000] [--embeddings file.npy]
+    python benchmark.py encode [path/to/document.pdf]
+    python benchmark.py chunking path/to/document.pdf [...]
+    python benchmark.py load path/to/document.pdf [--concurrency 16 --requests 200]
+    python benchmark.py startup [--port 8765]
+    python benchmark.py scaling path/to/document.pdf [--workers 1 2 4]
+    python benchmark.py inference [path/to/document.pdf]
+    python benchmark.py justification path/to/document.pdf [--repeat 4 --answers 20]
+    python benchmark.py retrieval path/to/document.pdf [--queries 200 -k 3]
+    python benchmark.py corpus path/to/document.pdf [--documents 10 50 200]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def time_call(func, iterations):
+    """Run func `iterations` times and return per-call latencies in seconds"""
+    timings = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+def format_latency(seconds):
+    """Human readable latency"""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+def report(label, timings):
+    """Print median / p99 for a list of timings"""
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<40} median {format_latency(statistics.median(ordered)):>10}   p99 {format_latency(p99):>10}")
+
+
+# ---- BENCHMARKS ---- #
+
+def bench_cache_hit(args):
+    """Document ID lookup on a cache hit: full MD5 per request vs. registry"""
+    from documents import DocumentRegistry, get_file_hash, store_upload
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        source_path = os.path.join(upload_dir, "source.bin")
+        with open(source_path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        with open(source_path, "rb") as f:
+            file_location, file_hash, _ = store_upload(f, "document.pdf", upload_dir)
+
+        registry = DocumentRegistry()
+        registry.register(file_location, file_hash)
+
+        print(f"📄 Document size: {args.size_mb} MB")
+        before = time_call(lambda: get_file_hash(file_location), max(1, args.iterations // 20))
+        after = time_call(lambda: registry.get_document_id(file_location), args.iterations)
+        report("before: get_file_hash per request", before)
+        report("after:  DocumentRegistry lookup", after)
+        print(f"⚡ Speed-up: {statistics.median(before) / statistics.median(after):.0f}x")
+
+
+def bench_extraction(args):
+    """Whole-file pdfminer extraction vs. the parallel page-streaming extractor"""
+    from pdfminer.high_level import extract_text
+    from extraction import iter_pdf_pages
+
+    start_time = time.perf_counter()
+    extract_text(args.path)
+    baseline = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    first_page = None
+    page_timings = []
+    for page in iter_pdf_pages(args.path):
+        if first_page is None:
+            first_page = time.perf_counter() - start_time
+        page_timings.append(page["seconds"])
+    streamed = time.perf_counter() - start_time
+
+    print(f"📄 Pages: {len(page_timings)}")
+    print(f"before: extract_text (first text after)  {format_latency(baseline)}")
+    print(f"after:  iter_pdf_pages first page        {format_latency(first_page)}")
+    print(f"after:  iter_pdf_pages all pages         {format_latency(streamed)}")
+    report("per-page extraction", page_timings)
+
+
+def bench_ann(args):
+    """Recall@k and query latency of the HNSW / IVF-PQ index modes against exact Flat search"""
+    import numpy as np
+    from askanything import build_index, configure_index
+
+    if args.embeddings:
+        embeddings = np.ascontiguousarray(np.load(args.embeddings), dtype=np.float32)
+    else:
+        # Clustered synthetic vectors behave more like real embeddings than uniform noise
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(256, 384)).astype(np.float32)
+        embeddings = centers[rng.integers(0, 256, args.vectors)] + 0.3 * rng.normal(size=(args.vectors, 384)).astype(np.float32)
+    queries = embeddings[np.random.default_rng(1).choice(len(embeddings), args.queries, replace=False)] + 0.05
+
+    flat = build_index(embeddings, index_type="flat")
+    start_time = time.perf_counter()
+    _, truth = flat.search(queries, args.k)
+    flat_latency = (time.perf_counter() - start_time) / len(queries)
+
+    print(f"📊 {len(embeddings)} vectors, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<12}{'setting':<16}{'recall':>8}{'latency/query':>16}")
+    print(f"{'flat':<12}{'-':<16}{1.0:>8.3f}{format_latency(flat_latency):>16}")
+
+    sweeps = [("hnsw", "efSearch", [16, 32, 64, 128, 256]), ("ivfpq", "nprobe", [1, 4, 16, 64])]
+    for index_type, knob, values in sweeps:
+        index = build_index(embeddings, index_type=index_type)
+        for value in values:
+            if knob == "efSearch":
+                configure_index(index, ef_search=value)
+            else:
+                configure_index(index, nprobe=value)
+            start_time = time.perf_counter()
+            _, found = index.search(queries, args.k)
+            latency = (time.perf_counter() - start_time) / len(queries)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            print(f"{index_type:<12}{f'{knob}={value}':<16}{recall:>8.3f}{format_latency(latency):>16}")
+
+
+def load_benchmark_chunks(path):
+    """Chunk texts of a document, or synthetic paragraphs of varied length"""
+    if path:
+        from upload import get_extracted_text
+        from askanything import parse_document_with_structure
+        return [chunk["text"] for chunk in parse_document_with_structure(get_extracted_text(path))]
+
+    import random
+    rng = random.Random(0)
+    words = "the model retrieves relevant passages from the uploaded document before answering".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.choice([4, 12, 40, 120]))) for _ in range(5000)]
+
+def bench_encode(args):
+    """Encoding throughput: default SentenceTransformer batching vs. the shared embedding service"""
+    from embedding_service import get_encoder, encode
+
+    encoder = get_encoder()
+    texts = load_benchmark_chunks(args.path)
+    print(f"📄 Texts: {len(texts)}")
+
+    start_time = time.perf_counter()
+    encoder.encode(texts)
+    before = time.perf_counter() - start_time
+
+    # Uncached, so reruns time the encoder rather than embedding-store reads
+    start_time = time.perf_counter()
+    encode(texts, use_cache=False)
+    after = time.perf_counter() - start_time
+
+    print(f"before: encoder.encode (batch_size=32)   {format_latency(before):>10}   {len(texts) / before:.0f} texts/s")
+    print(f"after:  embedding_service.encode          {format_latency(after):>10}   {len(texts) / after:.0f} texts/s")
+
+
+def bench_chunking(args):
+    """Line-per-chunk parsing vs. the token-aware paragraph chunker: chunk count, index size, encode time"""
+    from upload import get_extracted_text
+    from chunking import iter_line_chunks, iter_chunks
+    from embedding_service import get_encoder, encode
+    from askanything import build_index
+
+    encoder = get_encoder()
+
+    print(f"{'document':<32}{'chunker':<12}{'chunks':>8}{'index size':>14}{'encode':>12}")
+    for path in args.paths:
+        text = get_extracted_text(path)
+        for name, chunker in [("lines", iter_line_chunks([text])), ("semantic", iter_chunks([text], encoder.tokenizer))]:
+            texts = [chunk["text"] for chunk in chunker]
+            start_time = time.perf_counter()
+            embeddings = encode(texts, use_cache=False)
+            encode_time = time.perf_counter() - start_time
+            index = build_index(embeddings)
+            index_bytes = index.ntotal * index.d * 4
+            print(f"{os.path.basename(path)[:30]:<32}{name:<12}{len(texts):>8}{index_bytes / 1024:>11.0f} KB{format_latency(encode_time):>12}")
+
+
+def bench_load(args):
+    """Concurrent question load: throughput and p99 latency per micro-batching setting"""
+    from concurrent.futures import ThreadPoolExecutor
+    from documents import DocumentSession, get_file_hash
+    from askanything import QA_BATCH_QUESTIONS, initialize_document_index, search_chunks, encode_question_batch, answer_question_batch
+    from workers import MicroBatcher
+
+    session = DocumentSession(get_file_hash(args.path), args.path)
+    initialize_document_index(session)
+    words = sorted({word for chunk in session.structured_chunks for word in chunk["text"].split() if word.isalpha() and len(word) > 5})
+
+    print(f"📄 {len(session.structured_chunks)} chunks, {args.requests} requests, {args.concurrency} concurrent clients")
+    print(f"{'setting':<28}{'throughput':>14}{'median':>12}{'p99':>12}")
+    settings = [(0, 1), (2, 32), (5, 32), (10, 32), (20, 32)]
+    for run, (max_wait_ms, max_batch_size) in enumerate(settings):
+        question_batcher = MicroBatcher(f"bench_encode_{run}", encode_question_batch, max_wait_ms, max_batch_size)
+        qa_batcher = MicroBatcher(f"bench_qa_{run}", answer_question_batch, max_wait_ms, min(max_batch_size, QA_BATCH_QUESTIONS))
+        # Fresh questions per run so the embedding cache does not favour later settings
+        questions = [f"What does the document say about {words[(run * args.requests + i) % len(words)]} (run {run})?" for i in range(args.requests)]
+
+        def request(question):
+            start_time = time.perf_counter()
+            q_embedding = question_batcher.submit(question).result()
+            top_chunks = search_chunks(q_embedding[None, :], session)[0]
+            qa_batcher.submit((question, top_chunks)).result()
+            return time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            timings = sorted(executor.map(request, questions))
+        elapsed = time.perf_counter() - start_time
+
+        label = "no batching" if max_batch_size == 1 else f"wait {max_wait_ms} ms, batch <= {max_batch_size}"
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{label:<28}{len(timings) / elapsed:>10.1f} q/s{format_latency(statistics.median(timings)):>12}{format_latency(p99):>12}")
+
+
+def bench_startup(args):
+    """Backend import time, time until the port accepts connections, and time until every model is ready"""
+    import json
+    import socket
+    import subprocess
+    import sys
+    import urllib.error
+    import urllib.request
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=backend_dir, check=True, capture_output=True)
+    import_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)],
+        cwd=backend_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", args.port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        bind_time = time.perf_counter() - start_time
+
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/ready/") as response:
+                    body = json.load(response)
+                break
+            except urllib.error.HTTPError as e:
+                body = json.load(e)
+                if any(model["state"] == "failed" for model in body["models"].values()):
+                    break
+            time.sleep(0.1)
+        ready_time = time.perf_counter() - start_time
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"import main                       {format_latency(import_time):>10}")
+    print(f"uvicorn port accepting            {format_latency(bind_time):>10}")
+    print(f"all models ready                  {format_latency(ready_time):>10}")
+    for name, model in body["models"].items():
+        seconds = format_latency(model["seconds"]) if model["seconds"] is not None else "-"
+        print(f"   {name:<30} {model['state']:<8} {seconds:>10}")
+
+
+def bench_scaling(args):
+    """QA throughput over HTTP with serve.py running 1, 2, 4, ... forked workers"""
+    import subprocess
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    import requests
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':<10}{'throughput':>14}{'median':>12}{'p99':>12}")
+    for run, workers in enumerate(args.workers):
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port)],
+            cwd=backend_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                try:
+                    response = requests.get(f"{base_url}/ready/")
+                    if response.ok:
+                        break
+                    if any(model["state"] == "failed" for model in response.json()["models"].values()):
+                        raise RuntimeError("A model failed to load - see the backend log")
+                except requests.ConnectionError:
+                    pass
+                time.sleep(0.2)
+
+            with open(args.path, "rb") as f:
+                document_id = requests.post(f"{base_url}/upload/", files={"file": f}).json()["document_id"]
+            # Every worker builds (or maps) the index before timing starts
+            for _ in range(workers * 4):
+                requests.post(f"{base_url}/askanything/", json={"question": "What is this document about?", "document_id": document_id})
+
+            def ask(i):
+                start_time = time.perf_counter()
+                requests.post(f"{base_url}/askanything/", json={"question": f"What is described in part {i} (run {run})?", "document_id": document_id})
+                return time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                timings = sorted(executor.map(ask, range(args.requests)))
+            elapsed = time.perf_counter() - start_time
+        finally:
+            server.terminate()
+            server.wait()
+
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{workers:<10}{len(timings) / elapsed:>10.1f} q/s{format_latency(statistics.median(timings)):>12}{format_latency(p99):>12}")
+
+
+def normalize_answer(text):
+    """SQuAD answer normalization: lowercase, no punctuation, articles or extra whitespace"""
+    import re
+    import string
+    text = "".join(ch for ch in text.lower() if ch not in string.punctuation)
+    return " ".join(re.sub(r"\b(a|an|the)\b", " ", text).split())
+
+def answer_f1(prediction, reference):
+    """SQuAD token-overlap F1 between two answers"""
+    from collections import Counter
+    predicted, expected = normalize_answer(prediction).split(), normalize_answer(reference).split()
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if not predicted or not expected:
+        return float(predicted == expected)
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+def bench_inference(args):
+    """Accuracy parity (embedding cosine, answer EM/F1 vs. fp32 PyTorch) and throughput per inference backend"""
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    from transformers import pipeline
+    from embedding_service import EMBEDDING_MODEL_NAME
+    from askanything import QA_MODEL_NAME, extract_answers
+    from inference import optimize_encoder, optimize_qa_pipeline
+
+    texts = load_benchmark_chunks(args.path)[:args.texts]
+    # One question per chunk about its longest word; references are the fp32 answers
+    pairs = [(f"What is said about {max(text.split(), key=len)}?", text) for text in texts[:args.pairs]]
+
+    print(f"📄 {len(texts)} texts, {len(pairs)} QA pairs (parity is measured against fp32 PyTorch)")
+    print(f"{'backend':<16}{'encode':>12}{'cos mean':>10}{'cos min':>10}{'QA':>14}{'EM':>8}{'F1':>8}")
+    reference_embeddings = reference_answers = None
+    for backend, quantize in [("torch", False), ("torch", True), ("onnx", False), ("onnx", True)]:
+        encoder = optimize_encoder(SentenceTransformer(EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME, backend, quantize)
+        encoder.encode(texts[:8])
+        start_time = time.perf_counter()
+        embeddings = encoder.encode(texts, normalize_embeddings=True)
+        encode_rate = len(texts) / (time.perf_counter() - start_time)
+
+        qa_pipeline = optimize_qa_pipeline(pipeline("question-answering", model=QA_MODEL_NAME), QA_MODEL_NAME, backend, quantize)
+        extract_answers(pairs[:4], qa_pipeline)
+        start_time = time.perf_counter()
+        answers = []
+        for start in range(0, len(pairs), args.qa_batch):
+            answers += [result["answer"] for result in extract_answers(pairs[start:start + args.qa_batch], qa_pipeline)]
+        qa_rate = len(pairs) / (time.perf_counter() - start_time)
+
+        if reference_embeddings is None:
+            reference_embeddings, reference_answers = embeddings, answers
+        cosines = np.sum(embeddings * reference_embeddings, axis=1)
+        exact = np.mean([normalize_answer(a) == normalize_answer(b) for a, b in zip(answers, reference_answers)])
+        f1 = np.mean([answer_f1(a, b) for a, b in zip(answers, reference_answers)])
+
+        label = backend + ("-int8" if quantize else "")
+        print(f"{label:<16}{encode_rate:>8.0f} t/s{cosines.mean():>10.4f}{cosines.min():>10.4f}{qa_rate:>10.1f} q/s{exact:>8.3f}{f1:>8.3f}")
+
+
+def legacy_justification(context, expected_ans):
+    """The scan extract_justification used to run per answer: substring, word sets, then every sentence encoded"""
+    import numpy as np
+    from embedding_service import encode
+
+    sentences = [s.strip() for s in context.split('.') if len(s.strip()) > 10]
+    relevant = [sentence for sentence in sentences if expected_ans.lower() in sentence.lower()]
+    if not relevant:
+        keywords = set(expected_ans.lower().split())
+        relevant = [sentence for sentence in sentences if keywords & set(sentence.lower().split())]
+    if not relevant:
+        embeddings = encode(sentences, normalize=True, use_cache=False)
+        similarities = embeddings @ encode([expected_ans], normalize=True, use_cache=False)[0]
+        relevant = [sentences[i] for i in np.argsort(-similarities)[:2] if similarities[i] > 0.3]
+    return relevant[:2]
+
+def bench_justification(args):
+    """Justification lookup per answer: full-document scan vs. the prebuilt sentence index"""
+    import random
+    from upload import get_extracted_text
+    from extraction import count_pdf_pages
+    from embedding_service import encode
+    from sentence_index import build_sentence_index, tokenize
+
+    # Repeat the document to reach 100+ pages
+    text = "\n".join([get_extracted_text(args.path)] * args.repeat)
+    pages = count_pdf_pages(args.path) * args.repeat if args.path.lower().endswith(".pdf") else None
+
+    start_time = time.perf_counter()
+    index = build_sentence_index(text)
+    build_time = time.perf_counter() - start_time
+    print(f"📄 {pages or '?'} pages, {len(index)} sentences, {len(index.vocabulary)} distinct tokens")
+    print(f"{'sentence index build (once per document)':<40} {format_latency(build_time):>10}")
+
+    # Phrases found verbatim, phrases sharing only some words, and phrases absent from the document
+    rng = random.Random(0)
+    words = sorted({token for token in tokenize(text) if token.isalpha() and len(token) > 4})
+    answers = []
+    for i in range(args.answers):
+        first, second = rng.sample(words, 2)
+        answers.append([f"{first} {second}", first, f"zzqx{i} unrelated concept"][i % 3])
+    embeddings = encode(answers, normalize=True)
+
+    iterations = iter(range(len(answers)))
+    legacy = time_call(lambda: legacy_justification(text, answers[next(iterations)]), len(answers))
+    iterations = iter(range(len(answers)))
+    indexed = time_call(lambda: index.find_justification(answers[i := next(iterations)], embeddings[i]), len(answers))
+    report("before: scan per answer", legacy)
+    report("after:  sentence index lookup", indexed)
+
+def bench_retrieval(args):
+    """Hit rate and latency of dense, sparse (BM25) and hybrid retrieval"""
+    import random
+    import re
+    from documents import DocumentSession, get_file_hash
+    from askanything import RETRIEVAL_MODES, initialize_document_index, search_questions
+    from embedding_service import encode
+
+    session = DocumentSession(get_file_hash(args.path), args.path)
+    initialize_document_index(session)
+    chunks = session.structured_chunks
+    position_of = {id(chunk): i for i, chunk in enumerate(chunks)}
+    rng = random.Random(0)
+
+    # Identifier queries: part numbers, clause IDs and acronyms found in at most 3 chunks
+    identifiers = {}
+    for position, chunk in enumerate(chunks):
+        for token in re.findall(r"\b(?:[A-Z]{2,}[A-Za-z0-9]*|[A-Za-z]*\d+(?:[.\-]\w+)*)\b", chunk["text"]):
+            identifiers.setdefault(token, set()).add(position)
+    rare = sorted(token for token, positions in identifiers.items() if len(positions) <= 3)
+    query_sets = {
+        "identifier": [(f"What does the document say about {token}?", identifiers[token]) for token in rng.sample(rare, min(args.queries, len(rare)))]
+    }
+    # Text queries: eight consecutive words of a random chunk
+    query_sets["text"] = []
+    for position in rng.sample(range(len(chunks)), min(args.queries, len(chunks))):
+        words = chunks[position]["text"].split()
+        start = rng.randrange(max(1, len(words) - 8))
+        query_sets["text"].append((" ".join(words[start:start + 8]), {position}))
+
+    print(f"📄 {len(chunks)} chunks, " + ", ".join(f"{len(queries)} {name} queries" for name, queries in query_sets.items()))
+    print(f"{'mode':<10}{'queries':<14}{f'hit@{args.k}':>8}{'median':>12}{'p99':>12}")
+    for mode in RETRIEVAL_MODES:
+        for name, queries in query_sets.items():
+            hits = 0
+            timings = []
+            for question, targets in queries:
+                start_time = time.perf_counter()
+                q_embeddings = None if mode == "sparse" else encode([question], use_cache=False)
+                top_chunks = search_questions([question], q_embeddings, session, args.k, mode)[0]
+                timings.append(time.perf_counter() - start_time)
+                hits += any(position_of[id(chunk)] in targets for chunk in top_chunks)
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            print(f"{mode:<10}{name:<14}{hits / len(queries):>8.1%}{format_latency(statistics.median(timings)):>12}{format_latency(p99):>12}")
+
+def bench_corpus(args):
+    """Corpus search latency as documents are added (perturbed copies of one document)"""
+    import random
+    import uuid
+    import numpy as np
+    from documents import DocumentSession, get_file_hash
+    from askanything import initialize_document_index, set_session_index
+    from corpus import Corpus
+    from embedding_service import encode
+
+    session = DocumentSession(get_file_hash(args.path), args.path)
+    initialize_document_index(session)
+    chunks = session.structured_chunks
+    rng = np.random.default_rng(0)
+    queries = [chunk["text"] for chunk in random.Random(0).sample(chunks, min(args.queries, len(chunks)))]
+    q_embeddings = encode(queries, use_cache=False)
+    noise = 0.05 * float(np.abs(session.embeddings).mean())
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        corpus = Corpus(corpus_dir)
+        print(f"📄 {len(chunks)} chunks per document, {len(queries)} queries, k={args.k}")
+        print(f"{'documents':>10}{'chunks':>10}{'add (mean)':>12}{'median':>12}{'p99':>12}{'filtered':>12}{'p99':>12}")
+        added = 0
+        for target in sorted(args.documents):
+            add_timings = []
+            while added < target:
+                copy = DocumentSession(uuid.uuid4().hex, args.path)
+                embeddings = (session.embeddings + rng.normal(0, noise, session.embeddings.shape)).astype(np.float32)
+                set_session_index(copy, chunks, embeddings, session.index, session.sparse_index)
+                start_time = time.perf_counter()
+                corpus.add_document(copy, f"copy-{added}.pdf", {"group": str(added % 10)})
+                add_timings.append(time.perf_counter() - start_time)
+                added += 1
+
+            row = f"{added:>10}{corpus.get_stats()['chunks']:>10}{format_latency(statistics.mean(add_timings)) if add_timings else '-':>12}"
+            for filters in (None, {"metadata": {"group": "0"}}):
+                timings = []
+                for q_embedding in q_embeddings:
+                    start_time = time.perf_counter()
+                    corpus.search(q_embedding, args.k, filters)
+                    timings.append(time.perf_counter() - start_time)
+                timings.sort()
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                row += f"{format_latency(statistics.median(timings)):>12}{format_latency(p99):>12}"
+            print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend performance benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    cache_hit = subparsers.add_parser("cache-hit", help="Document ID cost on a cache hit")
+    cache_hit.add_argument("--size-mb", type=int, default=100)
+    cache_hit.add_argument("--iterations", type=int, default=200)
+    cache_hit.set_defaults(func=bench_cache_hit)
+
+    extraction = subparsers.add_parser("extraction", help="PDF text extraction latency")
+    extraction.add_argument("path")
+    extraction.set_defaults(func=bench_extraction)
+
+    ann = subparsers.add_parser("ann", help="ANN index recall vs. latency")
+    ann.add_argument("--vectors", type=int, default=100000)
+    ann.add_argument("--embeddings", help="Embedding matrix (.npy) to index instead of synthetic vectors")
+    ann.add_argument("--queries", type=int, default=500)
+    ann.add_argument("-k", type=int, default=3)
+    ann.set_defaults(func=bench_ann)
+
+    encode = subparsers.add_parser("encode", help="Embedding throughput")
+    encode.add_argument("path", nargs="?", help="Document to chunk and encode (default: synthetic texts)")
+    encode.set_defaults(func=bench_encode)
+
+    chunking = subparsers.add_parser("chunking", help="Chunk count, index size and encode time per chunker")
+    chunking.add_argument("paths", nargs="+")
+    chunking.set_defaults(func=bench_chunking)
+
+    load = subparsers.add_parser("load", help="Concurrent question throughput and p99 with micro-batching")
+    load.add_argument("path")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--requests", type=int, default=200)
+    load.set_defaults(func=bench_load)
+
+    startup = subparsers.add_parser("startup", help="Import, port-bind and model-ready time of the backend")
+    startup.add_argument("--port", type=int, default=8765)
+    startup.set_defaults(func=bench_startup)
+
+    scaling = subparsers.add_parser("scaling", help="QA throughput vs. number of forked workers")
+    scaling.add_argument("path")
+    scaling.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    scaling.add_argument("--concurrency", type=int, default=32)
+    scaling.add_argument("--requests", type=int, default=400)
+    scaling.add_argument("--port", type=int, default=8766)
+    scaling.set_defaults(func=bench_scaling)
+
+    inference = subparsers.add_parser("inference", help="Parity and throughput of the ONNX / int8 inference backends")
+    inference.add_argument("path", nargs="?", help="Document to chunk (default: synthetic texts)")
+    inference.add_argument("--texts", type=int, default=1000)
+    inference.add_argument("--pairs", type=int, default=200)
+    inference.add_argument("--qa-batch", type=int, default=24)
+    inference.set_defaults(func=bench_inference)
+
+    justification = subparsers.add_parser("justification", help="Justification lookup: sentence scan vs. sentence index")
+    justification.add_argument("path")
+    justification.add_argument("--repeat", type=int, default=1, help="Concatenate the document this many times")
+    justification.add_argument("--answers", type=int, default=30)
+    justification.set_defaults(func=bench_justification)
+
+    retrieval = subparsers.add_parser("retrieval", help="Hit rate and latency of dense, sparse and hybrid retrieval")
+    retrieval.add_argument("path")
+    retrieval.add_argument("--queries", type=int, default=200)
+    retrieval.add_argument("-k", type=int, default=3)
+    retrieval.set_defaults(func=bench_retrieval)
+
+    corpus = subparsers.add_parser("corpus", help="Cross-document search latency vs. corpus size")
+    corpus.add_argument("path")
+    corpus.add_argument("--documents", type=int, nargs="+", default=[10, 50, 200])
+    corpus.add_argument("--queries", type=int, default=200)
+    corpus.add_argument("-k", type=int, default=10)
+    corpus.set_defaults(func=bench_corpus)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
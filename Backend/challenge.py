@@ -1,47 +1,153 @@
-from keybert import KeyBERT
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from sentence_transformers import SentenceTransformer, util
-from upload import get_extracted_text
+import time
+import numpy as np
+from embedding_service import get_encoder, encode
+from models import ModelHandle
+from inference import optimize_seq2seq
+from upload import get_extracted_text, get_document_text
+from sentence_index import get_sentence_index
 
+QG_MODEL_NAME = "mrm8488/t5-base-finetuned-question-generation-ap"
 
 kw_model = None
 qg_model = None
 tokenizer = None
 similarity_model = None
 
+def load_keybert():
+    from keybert import KeyBERT
+    encoder = get_encoder()
+    if encoder is None:
+        raise RuntimeError("Shared SentenceTransformer model not available")
+    return KeyBERT(model=encoder)
+
+def load_question_generator():
+    from transformers import T5Tokenizer, T5ForConditionalGeneration
+    return T5Tokenizer.from_pretrained(QG_MODEL_NAME), optimize_seq2seq(T5ForConditionalGeneration.from_pretrained(QG_MODEL_NAME))
+
+# Loaded on first use or by the warm-up in main.py
+keybert_handle = ModelHandle("keybert", load_keybert)
+question_generator_handle = ModelHandle("question_generation", load_question_generator)
+
 def initialize_models():
-    """Initialize models with error handling"""
+    """Resolve the lazily loaded models; False if any of them failed to load"""
     global kw_model, qg_model, tokenizer, similarity_model
     
-    try:
-        if kw_model is None:
-            print("Loading KeyBERT model...")
-            kw_model = KeyBERT("all-MiniLM-L6-v2")
-        
-        if similarity_model is None:
-            print("Loading SentenceTransformer model...")
-            similarity_model = SentenceTransformer("all-MiniLM-L6-v2")
-        
-        if qg_model is None or tokenizer is None:
-            print("Loading T5 question generation model...")
-            tokenizer = T5Tokenizer.from_pretrained("mrm8488/t5-base-finetuned-question-generation-ap")
-            qg_model = T5ForConditionalGeneration.from_pretrained("mrm8488/t5-base-finetuned-question-generation-ap")
-        
-        return True
-    except Exception as e:
-        print(f"Error initializing models: {e}")
+    kw_model = keybert_handle.get()
+    question_generator = question_generator_handle.get()
+    similarity_model = get_encoder()
+    if kw_model is None or question_generator is None:
         return False
+    
+    tokenizer, qg_model = question_generator
+    return True
+
+CHALLENGE_QUESTIONS = 3  # default number of questions per challenge
+MAX_CHALLENGE_QUESTIONS = 20
+PASSAGE_DIVERSITY = 0.7  # MMR weight of covering new ground vs. staying central to the document
+PASSAGES_PER_QUESTION = 2  # candidate passages per question, in case some yield no key phrase
+SUPPORTING_CHUNKS = 3  # chunks retrieved per key phrase to build its context
+MIN_PHRASE_SCORE = 0.3
+QG_MAX_INPUT_TOKENS = 512
+QG_MAX_QUESTION_TOKENS = 64
+QG_NUM_BEAMS = 4
+QG_BATCH_SIZE = 16  # prompts per generate() call
+
+def select_passages(embeddings, n, diversity=PASSAGE_DIVERSITY):
+    """
+    Indices of n chunks that are central to the document yet cover different parts of it.
+
+    Maximal marginal relevance over the chunk embeddings: each pick
+    maximizes cosine similarity to the document centroid minus similarity to
+    the chunks already picked.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    centroid = embeddings.mean(axis=0)
+    centroid = centroid / (np.linalg.norm(centroid) or 1.0)
+    relevance = embeddings @ centroid
+    selected = [int(np.argmax(relevance))]
+    max_overlap = embeddings @ embeddings[selected[0]]
+    while len(selected) < min(n, len(embeddings)):
+        scores = (1 - diversity) * relevance - diversity * max_overlap
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_overlap = np.maximum(max_overlap, embeddings @ embeddings[best])
+    return selected
+
+def pick_key_phrases(passages, n):
+    """One key phrase per passage (at most n), skipping phrases that repeat words already used"""
+    keywords = kw_model.extract_keywords(
+        passages,
+        keyphrase_ngram_range=(1, 3),
+        stop_words='english',
+        top_n=5
+    )
+    # KeyBERT unwraps the result for a single document
+    if len(passages) == 1 and keywords and isinstance(keywords[0], tuple):
+        keywords = [keywords]
+
+    picked = []
+    seen_words = set()
+    for position, phrases in enumerate(keywords):
+        for phrase, score in phrases:
+            phrase_words = set(phrase.lower().split())
+            if score > MIN_PHRASE_SCORE and (not phrase_words & seen_words or len(picked) < 2):
+                picked.append((phrase, position))
+                seen_words.update(phrase_words)
+                break
+        if len(picked) >= n:
+            break
+    return picked
+
+def get_supporting_context(phrase, source_chunk, retrieved, order):
+    """The source chunk plus retrieved chunks that mention the phrase, in document order"""
+    chunks = [source_chunk] + [chunk for chunk in retrieved if chunk is not source_chunk and phrase.lower() in chunk["text"].lower()]
+    chunks.sort(key=lambda chunk: order[id(chunk)])
+    return " ".join(chunk["text"] for chunk in chunks)
 
-# Global state for challenge
-stored_challenge_qas = []
+def generate_question_batch(prompts):
+    """Run every prompt through T5 as padded batches with a KV-cached beam search"""
+    import torch
 
-def generate_questions_and_answers():
-    """Generate questions and answers from the uploaded document"""
+    questions = []
+    for start in range(0, len(prompts), QG_BATCH_SIZE):
+        inputs = tokenizer(
+            prompts[start:start + QG_BATCH_SIZE],
+            return_tensors='pt',
+            padding=True,
+            truncation=True,
+            max_length=QG_MAX_INPUT_TOKENS
+        )
+        with torch.inference_mode():
+            output_ids = qg_model.generate(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_length=QG_MAX_QUESTION_TOKENS,
+                num_beams=QG_NUM_BEAMS,
+                early_stopping=True,
+                use_cache=True
+            )
+        questions.extend(tokenizer.batch_decode(output_ids, skip_special_tokens=True))
+    return questions
+
+def generate_questions_and_answers(session, num_questions=CHALLENGE_QUESTIONS):
+    """
+    Generate questions and answers from a whole document session.
+
+    Central but diverse passages are chosen from the retrieval index, one
+    key phrase is extracted per passage (one KeyBERT call for all of them),
+    each phrase's context is gathered with one batched index search, and all
+    (context, answer) prompts are generated as padded T5 batches. The
+    expected answers are kept on the session under `num_questions`, so
+    challenges of different sizes never replace each other.
+    """
+    from askanything import initialize_document_index, search_chunks
     
     if not initialize_models():
         return [{"question": "Error: Could not initialize models. Please try again."}]
     
-    context = get_extracted_text()
+    context = get_document_text(session)
     
     # Check if document is available
     if context == "No file uploaded yet.":
@@ -51,124 +157,66 @@ def generate_questions_and_answers():
     if len(context.strip()) < 50:
         return [{"question": "Document is too short to generate meaningful questions."}]
     
-    # Truncate context if too long for the model (T5 has 512 token limit)
-    if len(context) > 2000:  # Rough estimate to stay under token limit
-        context = context[:2000] + "..."
+    num_questions = max(1, min(num_questions, MAX_CHALLENGE_QUESTIONS))
     
     try:
-        # Extract key phrases with more diversity
-        key_phrases = kw_model.extract_keywords(
-            context, 
-            keyphrase_ngram_range=(1, 3), 
-            stop_words='english', 
-            top_n=10,  
-            diversity=0.7 
-        )
-        
-        # Filter and diversify key phrases
-        filtered_phrases = []
-        seen_words = set()
+        start_time = time.time()
+        if not initialize_document_index(session):
+            return [{"question": "Could not index the document for question generation."}]
         
-        for phrase, score in key_phrases:
-            if score > 0.3:  # Filter by relevance
-                
-                phrase_words = set(phrase.lower().split())
-                if not phrase_words.intersection(seen_words) or len(filtered_phrases) < 2:
-                    filtered_phrases.append(phrase)
-                    seen_words.update(phrase_words)
-                    
-                    if len(filtered_phrases) >= 5:  # Limit to 5 diverse phrases
-                        break
+        # Candidate passages from the whole document, then one key phrase each
+        chunks = session.structured_chunks
+        positions = select_passages(session.embeddings, num_questions * PASSAGES_PER_QUESTION)
+        passages = [chunks[position]["text"] for position in positions]
+        picked = pick_key_phrases(passages, num_questions)
         
-        if not filtered_phrases:
+        if not picked:
             return [{"question": "Could not extract meaningful topics from the document."}]
         
-        questions = []
-        global stored_challenge_qas
-        stored_challenge_qas = []
-
-        # Split context into different segments for variety
-        context_segments = []
-        sentences = context.split('.')
-        segment_size = len(sentences) // 3
-        
-        for i in range(3):
-            start_idx = i * segment_size
-            end_idx = (i + 1) * segment_size if i < 2 else len(sentences)
-            segment = '. '.join(sentences[start_idx:end_idx]).strip()
-            if segment:
-                context_segments.append(segment)
+        phrases = [phrase for phrase, _ in picked]
         
-        # If we don't have enough segments, use the full context
-        if len(context_segments) < 3:
-            context_segments = [context[:800], context[400:1200], context[800:1600]]
+        # Supporting context per phrase through the retrieval index
+        retrieved = search_chunks(encode(phrases), session, k=SUPPORTING_CHUNKS)
+        order = {id(chunk): i for i, chunk in enumerate(chunks)}
+        prompts = [
+            f"context: {get_supporting_context(phrase, chunks[positions[position]], top_chunks, order)} answer: {phrase}"
+            for (phrase, position), top_chunks in zip(picked, retrieved)
+        ]
         
-        for i, phrase in enumerate(filtered_phrases[:3]):  # Use filtered phrases
-            try:
-                # Use different context segments and generation parameters for variety
-                context_segment = context_segments[i % len(context_segments)]
-                
-                # Create input for question generation with varied context
-                input_text = f"context: {context_segment[:800]} answer: {phrase}"
-                input_ids = tokenizer.encode(input_text, return_tensors='pt', max_length=512, truncation=True)
-                
-                # Generate question with different parameters for variety
-                generation_params = [
-                    {"max_length": 64, "num_beams": 4, "do_sample": False, "temperature": 1.0},
-                    {"max_length": 72, "num_beams": 3, "do_sample": True, "temperature": 0.8},
-                    {"max_length": 56, "num_beams": 5, "do_sample": True, "temperature": 1.2}
-                ]
-                
-                params = generation_params[i % len(generation_params)]
-                
-                with tokenizer.as_target_tokenizer():
-                    output_ids = qg_model.generate(
-                        input_ids, 
-                        **params,
-                        early_stopping=True,
-                        pad_token_id=tokenizer.eos_token_id
-                    )
-                
-                question = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-                
-                # Clean up the question
-                question = question.strip()
-                if not question.endswith('?'):
-                    question += '?'
-                
-                # Check for duplicate questions
-                if question not in [q["question"] for q in questions]:
-                    questions.append({"question": question})
-                    stored_challenge_qas.append((question, phrase))
-                else:
-                    # Generate a fallback question if duplicate
-                    fallback_question = generate_fallback_question(phrase, i)
-                    questions.append({"question": fallback_question})
-                    stored_challenge_qas.append((fallback_question, phrase))
-                
-            except Exception as e:
-                print(f"Error generating question for phrase '{phrase}': {e}")
-                # Generate a fallback question
-                fallback_question = generate_fallback_question(phrase, i)
-                questions.append({"question": fallback_question})
-                stored_challenge_qas.append((fallback_question, phrase))
-                continue
+        questions = []
+        stored_challenge_qas = []
         
-        # If T5 model failed, use simple question generation
-        if not questions:
+        try:
+            generated = generate_question_batch(prompts)
+        except Exception as e:
+            print(f"Error generating questions: {e}")
             print("T5 model failed, using simple question generation...")
-            return generate_simple_questions(context, filtered_phrases)
+            return generate_simple_questions(context, phrases, session, num_questions)
         
+        for i, (phrase, question) in enumerate(zip(phrases, generated)):
+            # Clean up the question
+            question = question.strip()
+            if question and not question.endswith('?'):
+                question += '?'
+            
+            # Generate a fallback question if empty or duplicate
+            if not question or question in [q["question"] for q in questions]:
+                question = generate_fallback_question(phrase, i)
+            
+            questions.append({"question": question})
+            stored_challenge_qas.append((question, phrase))
+        
+        print(f"Generated {len(questions)} questions in {time.time() - start_time:.2f} seconds")
+        session.challenge_qas[num_questions] = stored_challenge_qas
         return questions
         
     except Exception as e:
         print(f"Error in generate_questions_and_answers: {e}")
         return [{"question": f"Error generating questions: {str(e)}"}]
 
-def generate_simple_questions(context, key_phrases):
+def generate_simple_questions(context, key_phrases, session, num_questions=CHALLENGE_QUESTIONS):
     """Fallback method to generate simple questions if T5 model fails"""
     questions = []
-    global stored_challenge_qas
     stored_challenge_qas = []
     
     
@@ -184,30 +232,68 @@ def generate_simple_questions(context, key_phrases):
     ]
     
     
-    for i, phrase in enumerate(key_phrases[:3]):
+    for i, phrase in enumerate(key_phrases[:num_questions]):
         template = templates[i * 2 % len(templates)]  # Skip templates for more variety
         question = template.format(phrase)
         questions.append({"question": question})
         stored_challenge_qas.append((question, phrase))
     
+    session.challenge_qas[num_questions] = stored_challenge_qas
     return questions
 
-def evaluate_user_answers(user_answers):
-    """Evaluate user answers against expected answers"""
+CORRECT_SIMILARITY = 0.6
+JUSTIFICATION_SENTENCES = 2
+
+def interpret_score(score):
+    if score >= 0.8:
+        return "✅ Excellent match!"
+    if score >= 0.6:
+        return "👍 Good match!"
+    if score >= 0.4:
+        return "⚠️ Partial match."
+    return "❌ Poor match."
+
+def evaluate_user_answers(user_answers, session, num_questions=CHALLENGE_QUESTIONS):
+    """
+    Evaluate user answers against the expected answers of the document
+    session's `num_questions`-question challenge.
+
+    Every user and expected answer is encoded in one batch, the pairwise
+    cosine similarities are computed in one operation, and justifying
+    sentences come from the document's prebuilt sentence index, so the cost
+    does not grow with document length.
+    """
     if not initialize_models():
         return [{"question": "Error: Could not initialize models for evaluation.", "user_answer": "", "is_correct": False, "similarity": 0, "justification": "Model initialization failed"}]
     
-    context = get_extracted_text()
+    stored_challenge_qas = session.challenge_qas.get(num_questions)
     
-    if context == "No file uploaded yet." or not stored_challenge_qas:
+    if not stored_challenge_qas or get_document_text(session) == "No file uploaded yet.":
         return [{"question": "No questions available for evaluation.", "user_answer": "", "is_correct": False, "similarity": 0, "justification": "No document or questions available"}]
     
-    results = []
+    pairs = list(zip(user_answers, stored_challenge_qas))
+    answered = [i for i, (user_ans, _) in enumerate(pairs) if user_ans and user_ans.strip()]
 
     try:
-        for user_ans, (question, expected_ans) in zip(user_answers, stored_challenge_qas):
+        scores = {}
+        justifications = {}
+        if answered:
+            # One encoder pass for all user answers followed by all expected answers
+            embeddings = encode([pairs[i][0] for i in answered] + [pairs[i][1][1] for i in answered])
+            normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            similarities = np.einsum("ij,ij->i", normalized[:len(answered)], normalized[len(answered):])
+
+            sentence_index = get_sentence_index(session)
+            for i, score, expected_embedding in zip(answered, similarities, normalized[len(answered):]):
+                user_ans, (question, expected_ans) = pairs[i]
+                scores[i] = float(score)
+                relevant_sentences = sentence_index.find_justification(expected_ans, expected_embedding, JUSTIFICATION_SENTENCES) if sentence_index else []
+                justifications[i] = extract_justification(relevant_sentences, expected_ans, user_ans)
+
+        results = []
+        for i, (user_ans, (question, expected_ans)) in enumerate(pairs):
             # Handle empty user answers
-            if not user_ans or not user_ans.strip():
+            if i not in scores:
                 results.append({
                     "question": question,
                     "expected_answer": expected_ans,
@@ -217,51 +303,16 @@ def evaluate_user_answers(user_answers):
                     "justification": f"**❌ No answer provided.**\n**🎯 Expected answer:** {expected_ans}\n**💡 Hint:** Try to provide an answer based on the document content."
                 })
                 continue
-            
-            try:
-                # Calculate similarity
-                emb_user = similarity_model.encode(user_ans, convert_to_tensor=True)
-                emb_exp = similarity_model.encode(expected_ans, convert_to_tensor=True)
-                score = util.pytorch_cos_sim(emb_user, emb_exp).item()
-                is_correct = score >= 0.6
-
-                # Extract justification with improved method
-                justification = extract_justification(context, expected_ans, user_ans, question)
-                
-                # Add score interpretation to justification
-                score_interpretation = ""
-                if score >= 0.8:
-                    score_interpretation = "✅ Excellent match!"
-                elif score >= 0.6:
-                    score_interpretation = "👍 Good match!"
-                elif score >= 0.4:
-                    score_interpretation = "⚠️ Partial match."
-                else:
-                    score_interpretation = "❌ Poor match."
-                
-                justification += f"\n\n**🎯 Similarity Score:** {round(score, 2)} - {score_interpretation}"
 
-                results.append({
-                    "question": question,
-                    "expected_answer": expected_ans,
-                    "user_answer": user_ans,
-                    "is_correct": is_correct,
-                    "similarity": round(score, 2),
-                    "justification": justification
-                })
-                
-            except Exception as e:
-                print(f"Error evaluating answer for question '{question}': {e}")
-                # Still provide justification even if evaluation fails
-                fallback_justification = f"**📝 Your answer:** {user_ans}\n**🎯 Expected answer:** {expected_ans}\n**⚠️ Error:** Evaluation failed: {str(e)}"
-                results.append({
-                    "question": question,
-                    "expected_answer": expected_ans,
-                    "user_answer": user_ans,
-                    "is_correct": False,
-                    "similarity": 0.0,
-                    "justification": fallback_justification
-                })
+            score = scores[i]
+            results.append({
+                "question": question,
+                "expected_answer": expected_ans,
+                "user_answer": user_ans,
+                "is_correct": score >= CORRECT_SIMILARITY,
+                "similarity": round(score, 2),
+                "justification": justifications[i] + f"\n\n**🎯 Similarity Score:** {round(score, 2)} - {interpret_score(score)}"
+            })
 
     except Exception as e:
         print(f"Error in evaluate_user_answers: {e}")
@@ -299,44 +350,13 @@ def test_challenge_functionality():
     print("✅ Challenge functionality test completed")
     return True
 
-def extract_justification(context, expected_ans, user_ans, question):
-    """Extract meaningful justification from the document context"""
+def extract_justification(relevant_sentences, expected_ans, user_ans):
+    """Format the justification of an evaluated answer from its supporting sentences"""
     try:
-        # Split context into sentences
-        sentences = [s.strip() for s in context.split('.') if len(s.strip()) > 10]
-        
-        # Method 1: Look for sentences containing the expected answer
-        relevant_sentences = []
-        for sentence in sentences:
-            if expected_ans.lower() in sentence.lower():
-                relevant_sentences.append(sentence)
-        
-        # Method 2: If no direct match, look for sentences with similar keywords
-        if not relevant_sentences:
-            expected_keywords = set(expected_ans.lower().split())
-            for sentence in sentences:
-                sentence_words = set(sentence.lower().split())
-                if len(expected_keywords.intersection(sentence_words)) >= 1:
-                    relevant_sentences.append(sentence)
-        
-        # Method 3: Use semantic similarity to find relevant sentences
-        if not relevant_sentences and similarity_model:
-            sentence_embeddings = similarity_model.encode(sentences)
-            expected_embedding = similarity_model.encode([expected_ans])
-            
-            # Calculate similarities
-            similarities = util.pytorch_cos_sim(expected_embedding, sentence_embeddings)[0]
-            
-            # Get top 2 most similar sentences
-            top_indices = similarities.argsort(descending=True)[:2]
-            for idx in top_indices:
-                if similarities[idx] > 0.3:  # Only if reasonably similar
-                    relevant_sentences.append(sentences[idx])
-        
         # Format the justification
         if relevant_sentences:
             # Take the best 1-2 sentences
-            best_sentences = relevant_sentences[:2]
+            best_sentences = relevant_sentences[:JUSTIFICATION_SENTENCES]
             justification = f"**📚 Context from document:**\n"
             for i, sentence in enumerate(best_sentences, 1):
                 justification += f"{i}. {sentence.strip()}.\n"
@@ -370,7 +390,7 @@ def generate_fallback_question(phrase, index):
 # Uncomment the line below to test when the module is imported
 # test_challenge_functionality()
 
-def test_justification_extraction():
+def test_justification_extraction(session):
     """Test function to verify justification extraction works"""
     print("Testing justification extraction...")
     
@@ -379,7 +399,7 @@ def test_justification_extraction():
         print("❌ Cannot test - models not initialized")
         return
     
-    context = get_extracted_text()
+    context = get_document_text(session)
     if context == "No file uploaded yet.":
         print("❌ Cannot test - no document uploaded")
         return
@@ -387,9 +407,14 @@ def test_justification_extraction():
     # Test with sample data
     sample_expected_ans = "artificial intelligence"
     sample_user_ans = "AI technology"
-    sample_question = "What is AI?"
     
-    justification = extract_justification(context, sample_expected_ans, sample_user_ans, sample_question)
+    sentence_index = get_sentence_index(session)
+    if sentence_index is None:
+        print("❌ Cannot test - sentence index not available")
+        return
+    
+    relevant_sentences = sentence_index.find_justification(sample_expected_ans, encode([sample_expected_ans])[0], JUSTIFICATION_SENTENCES)
+    justification = extract_justification(relevant_sentences, sample_expected_ans, sample_user_ans)
     print(f"✅ Justification extracted:\n{justification}")
     
     return True
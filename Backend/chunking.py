@@ -0,0 +1,156 @@
+"""
+Token-aware document chunking.
+
+pdfminer breaks paragraphs at visual line wraps, so treating every line as a
+chunk produces thousands of sentence fragments. The chunker here re-joins
+wrapped lines into paragraphs (blank lines and section headers end a
+paragraph), then splits long paragraphs into token-bounded windows with
+overlap. Chunks keep the section / paragraph metadata used in answer
+justifications and are produced as a stream, page by page.
+"""
+
+import re
+from typing import Dict, Iterator
+
+CHUNK_MAX_TOKENS = 128  # all-MiniLM-L6-v2 was trained on 128-token inputs
+CHUNK_OVERLAP_TOKENS = 32
+
+def is_section_header(line):
+    """Numbered headings such as "2.1 Methods" start a new section"""
+    return line[0].isdigit() and '.' in line[:5]
+
+def join_lines(lines):
+    """Join wrapped lines into one paragraph, undoing end-of-line hyphenation"""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        elif text:
+            text += " " + line
+        else:
+            text = line
+    return text
+
+def get_token_spans(text, tokenizer=None):
+    """Character span of each token; whitespace-separated words without a tokenizer"""
+    if tokenizer is None:
+        return [match.span() for match in re.finditer(r"\S+", text)]
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    return encoded["offset_mapping"]
+
+def split_into_windows(text, tokenizer=None, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """Split text into windows of at most `max_tokens` tokens, consecutive windows sharing `overlap`"""
+    spans = get_token_spans(text, tokenizer)
+    if len(spans) <= max_tokens:
+        yield text
+        return
+
+    step = max(1, max_tokens - overlap)
+    for start in range(0, len(spans), step):
+        end = min(start + max_tokens, len(spans))
+        char_start, char_end = spans[start][0], spans[end - 1][1]
+        # Snap to word boundaries so sub-word tokens never split a word
+        while char_start > 0 and not text[char_start - 1].isspace():
+            char_start -= 1
+        while char_end < len(text) and not text[char_end].isspace():
+            char_end += 1
+        yield text[char_start:char_end]
+        if end == len(spans):
+            break
+
+def iter_paragraphs(pages) -> Iterator[Dict]:
+    """Yield {"section", "paragraph_number", "text"} paragraphs from page texts as they arrive"""
+    current_section = None
+    paragraph_count = 0
+    lines = []
+
+    def flush():
+        nonlocal paragraph_count
+        paragraph_count += 1
+        paragraph = {
+            "section": current_section,
+            "paragraph_number": paragraph_count,
+            "text": join_lines(lines)
+        }
+        lines.clear()
+        return paragraph
+
+    for page in pages:
+        for line in page.split('\n'):
+            line = line.strip()
+            if not line:
+                if lines:
+                    yield flush()
+                continue
+
+            if is_section_header(line):
+                if lines:
+                    yield flush()
+                current_section = line
+                paragraph_count = 0
+                continue
+
+            lines.append(line)
+
+    if lines:
+        yield flush()
+
+def iter_chunks(pages, tokenizer=None, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS) -> Iterator[Dict]:
+    """Yield token-bounded chunks with section / paragraph metadata from page texts"""
+    for paragraph in iter_paragraphs(pages):
+        # Page numbers and stray symbols carry nothing to retrieve
+        if not any(ch.isalpha() for ch in paragraph["text"]):
+            continue
+        for window in split_into_windows(paragraph["text"], tokenizer, max_tokens, overlap):
+            yield {
+                "section": paragraph["section"],
+                "paragraph_number": paragraph["paragraph_number"],
+                "text": window
+            }
+
+def pack_texts(texts, tokenizer=None, max_tokens=CHUNK_MAX_TOKENS) -> Iterator[str]:
+    """
+    Join consecutive texts into chunks of at most `max_tokens` tokens, without
+    overlap (summarization inputs). Texts longer than that are split first.
+    """
+    packed = []
+    packed_tokens = 0
+    for text in texts:
+        for window in split_into_windows(text, tokenizer, max_tokens, overlap=0):
+            tokens = len(get_token_spans(window, tokenizer))
+            if packed and packed_tokens + tokens > max_tokens:
+                yield "\n".join(packed)
+                packed = []
+                packed_tokens = 0
+            packed.append(window)
+            packed_tokens += tokens
+    if packed:
+        yield "\n".join(packed)
+
+def iter_packed_chunks(pages, tokenizer=None, max_tokens=CHUNK_MAX_TOKENS) -> Iterator[str]:
+    """Paragraphs of page texts packed into chunks of at most `max_tokens` tokens"""
+    paragraphs = (paragraph["text"] for paragraph in iter_paragraphs(pages) if any(ch.isalpha() for ch in paragraph["text"]))
+    yield from pack_texts(paragraphs, tokenizer, max_tokens)
+
+def iter_line_chunks(pages) -> Iterator[Dict]:
+    """Legacy chunking: every non-empty line is a chunk (kept for benchmarks)"""
+    current_section = None
+    paragraph_count = 0
+
+    for page in pages:
+        for line in page.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+
+            if is_section_header(line):
+                current_section = line
+                paragraph_count = 0
+                continue
+
+            paragraph_count += 1
+            yield {
+                "section": current_section,
+                "paragraph_number": paragraph_count,
+                "text": line
+            }
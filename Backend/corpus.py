@@ -0,0 +1,245 @@
+"""
+Cross-document corpus search.
+
+Every ingested document's chunk vectors are added to one of CORPUS_SHARDS
+FAISS shards (chosen from its document ID), under the vector ID
+(seq << POSITION_BITS) | position, where seq is the document's number in
+the CorpusStore. A query searches all shards in parallel and merges their
+top-k; metadata filters are resolved in SQLite to the matching documents'
+vector IDs and applied inside the FAISS search with an IDSelector. Each
+shard is an HNSW base plus a small exact delta (CorpusShard), so query
+latency stays flat as documents are added and an upload only rewrites the
+delta.
+
+Shard files are shared by every worker process: writers hold the corpus
+store's write transaction while they change a shard, and readers reload a
+file whenever it has been replaced.
+"""
+
+import os
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+from documents import CACHE_DIR
+from embedding_service import EMBEDDING_MODEL_ID
+from stores import CorpusStore
+from askanything import build_index, configure_index, read_mapped_index, initialize_document_index
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CORPUS_DIR = os.path.join(CACHE_DIR, "corpus", EMBEDDING_MODEL_ID.replace("/", "--"))
+CORPUS_SHARDS = 4
+POSITION_BITS = 24  # up to 16M chunks per document
+POSITION_MASK = (1 << POSITION_BITS) - 1
+SHARD_DELTA_MAX_VECTORS = 4096  # exact delta size at which a shard merges it into its HNSW base
+SEARCH_TOP_K = 10
+MAX_SEARCH_TOP_K = 100
+
+
+class ShardFile:
+    """One FAISS index file, reloaded (memory-mapped) whenever another process replaces it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get_index(self):
+        """The current index, or None while the file does not exist"""
+        version = self.get_version()
+        with self.lock:
+            if version != self.version:
+                if version is None:
+                    self.index = None
+                else:
+                    self.index = configure_index(read_mapped_index(self.path))
+                self.version = version
+            return self.index
+
+    def read(self):
+        """A writable copy of the index (None if the file does not exist)"""
+        return faiss.read_index(self.path) if os.path.exists(self.path) else None
+
+    def write(self, index):
+        faiss.write_index(index, self.path + ".tmp")
+        os.replace(self.path + ".tmp", self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def search(self, q_embeddings, k, ids=None):
+        """(distances, ids) of the top-k, restricted to `ids` when given"""
+        index = self.get_index()
+        if index is None or index.ntotal == 0:
+            return np.empty((len(q_embeddings), 0), dtype=np.float32), np.empty((len(q_embeddings), 0), dtype=np.int64)
+        params = None
+        if ids is not None:
+            base = faiss.downcast_index(index.index)
+            params_class = faiss.SearchParametersHNSW if isinstance(base, faiss.IndexHNSW) else faiss.SearchParameters
+            params = params_class(sel=faiss.IDSelectorBatch(ids))
+        return index.search(q_embeddings, min(k, index.ntotal), params=params)
+
+
+class CorpusShard:
+    """
+    A large HNSW base index plus a small exact delta index.
+
+    New documents only rewrite the delta; once it would exceed
+    SHARD_DELTA_MAX_VECTORS its vectors are inserted into the base graph,
+    which is then rewritten. Ingest therefore rewrites the base once per
+    SHARD_DELTA_MAX_VECTORS vectors instead of on every upload, and a query
+    searches one graph plus at most SHARD_DELTA_MAX_VECTORS exact vectors.
+    """
+
+    def __init__(self, path):
+        self.base = ShardFile(path)
+        self.delta = ShardFile(path.replace(".faiss", ".delta.faiss"))
+
+    def add(self, embeddings, ids):
+        """Add vectors (caller holds the corpus write transaction)"""
+        delta = self.delta.read()
+        if delta is None:
+            delta = build_index(embeddings, ids, "flat")
+        else:
+            delta.add_with_ids(embeddings, ids)
+        if delta.ntotal < SHARD_DELTA_MAX_VECTORS:
+            self.delta.write(delta)
+            return
+
+        # Merge the delta into the base graph (built on the first merge)
+        delta_vectors = faiss.downcast_index(delta.index).reconstruct_n(0, delta.ntotal)
+        delta_ids = faiss.vector_to_array(delta.id_map).astype(np.int64)
+        base = self.base.read()
+        if base is None:
+            base = build_index(delta_vectors, delta_ids, "hnsw")
+        else:
+            base.add_with_ids(delta_vectors, delta_ids)
+        # Readers may briefly see the merged vectors in both files; search drops the duplicates
+        self.base.write(base)
+        self.delta.remove()
+        logger.info(f"Merged {delta.ntotal} vectors into {self.base.path} ({base.ntotal} total)")
+
+    def search(self, q_embeddings, k, ids=None):
+        """(distances, ids) of the top-k of the base and delta combined"""
+        base_distances, base_ids = self.base.search(q_embeddings, k, ids)
+        delta_distances, delta_ids = self.delta.search(q_embeddings, k, ids)
+        distances = np.hstack([base_distances, delta_distances])
+        top = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, top, axis=1), np.take_along_axis(np.hstack([base_ids, delta_ids]), top, axis=1)
+
+
+class Corpus:
+    """The sharded corpus index and its document store"""
+
+    def __init__(self, directory=CORPUS_DIR, num_shards=CORPUS_SHARDS):
+        os.makedirs(directory, exist_ok=True)
+        self.store = CorpusStore(os.path.join(directory, "corpus.sqlite3"))
+        self.shards = [CorpusShard(os.path.join(directory, f"shard-{i}.faiss")) for i in range(num_shards)]
+        self.executor = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="corpus-shard")
+
+    def get_shard_number(self, document_id):
+        """Document IDs are content hashes, so their leading hex digits spread documents evenly"""
+        return int(document_id[:8], 16) % len(self.shards)
+
+    def add_document(self, session, filename=None, metadata=None, replaces=None):
+        """
+        Add an indexed document session to the corpus; returns False if it
+        could not be indexed. Without `metadata`, the document keeps the
+        metadata of the document it `replaces` (or of its own earlier upload).
+        """
+        if not initialize_document_index(session):
+            return False
+        if metadata is None:
+            metadata = self.store.get_metadata(replaces or session.document_id) or {}
+        shard_number = self.get_shard_number(session.document_id)
+        embeddings = np.ascontiguousarray(session.embeddings, dtype=np.float32)
+
+        def write_vectors(seq):
+            ids = (np.int64(seq) << POSITION_BITS) + np.arange(len(embeddings), dtype=np.int64)
+            self.shards[shard_number].add(embeddings, ids)
+
+        self.store.add_document(session.document_id, shard_number, filename, metadata, session.structured_chunks, write_vectors)
+        logger.info(f"Added {session.document_id} ({len(embeddings)} chunks) to corpus shard {shard_number}")
+        return True
+
+    def remove_document(self, document_id):
+        self.store.deactivate(document_id)
+
+    def search(self, q_embedding, k=SEARCH_TOP_K, filters=None):
+        """
+        Top-k chunks across all documents for one query embedding, best first.
+
+        `filters` may hold document_ids, filename (substring), metadata
+        (exact key/value matches) and uploaded_after / uploaded_before (Unix
+        time). Each result carries its document, section and paragraph.
+        """
+        q_embeddings = np.asarray(q_embedding, dtype=np.float32).reshape(1, -1)
+
+        # Filters become per-shard vector ID sets, and shards with no match are skipped
+        shard_ids = [None] * len(self.shards)
+        searched = list(range(len(self.shards)))
+        if filters:
+            shard_ids = [[] for _ in self.shards]
+            for seq, shard_number, num_chunks in self.store.select_documents(**filters):
+                shard_ids[shard_number].append((np.int64(seq) << POSITION_BITS) + np.arange(num_chunks, dtype=np.int64))
+            shard_ids = [np.concatenate(ids) if ids else None for ids in shard_ids]
+            searched = [i for i, ids in enumerate(shard_ids) if ids is not None]
+
+        # Unfiltered searches may hit superseded documents; fetch more until k active hits remain
+        fetch = k
+        while True:
+            futures = [self.executor.submit(self.shards[i].search, q_embeddings, fetch, shard_ids[i]) for i in searched]
+            candidates = {}
+            exhausted = True
+            for future in futures:
+                distances, ids = future.result()
+                exhausted = exhausted and len(ids[0]) < fetch
+                for distance, vector_id in zip(distances[0], ids[0]):
+                    if vector_id >= 0:
+                        candidates[int(vector_id)] = float(distance)
+            top = heapq.nsmallest(fetch, ((distance, vector_id) for vector_id, distance in candidates.items()))
+
+            keys = [(vector_id >> POSITION_BITS, vector_id & POSITION_MASK) for _, vector_id in top]
+            chunks = self.store.get_chunks(keys)
+            results = [{**chunks[key], "distance": round(distance, 4)} for (distance, _), key in zip(top, keys) if key in chunks]
+            if len(results) >= k or exhausted or filters:
+                return results[:k]
+            fetch *= 4
+
+    def get_stats(self):
+        documents, chunks = self.store.count()
+        return {"documents": documents, "chunks": chunks, "shards": len(self.shards)}
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+def get_corpus():
+    """The process-wide corpus, opened on first use"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = Corpus()
+        return _corpus
+
+def search_corpus(q_embedding, k=SEARCH_TOP_K, filters=None):
+    return get_corpus().search(q_embedding, k, filters)
+
+def get_corpus_stats():
+    return get_corpus().get_stats()
@@ -0,0 +1,201 @@
+import os
+import re
+import glob
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stored documents and the persistent, cross-process caches; override with environment variables
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(UPLOAD_DIR, ".cache"))
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read keeps memory flat for large PDFs
+MAX_SESSIONS = 10
+DOCUMENT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+def get_file_hash(file_path):
+    """Calculate MD5 hash of a file for caching, reading it in fixed-size chunks"""
+    try:
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                md5.update(block)
+        return md5.hexdigest()
+    except Exception as e:
+        logger.error(f"Error calculating file hash: {e}")
+        return None
+
+def get_stored_path(file_hash, filename, upload_dir=UPLOAD_DIR):
+    """Content-addressed location of an upload: <upload_dir>/<md5><ext>"""
+    ext = os.path.splitext(filename or "")[-1].lower()
+    return os.path.join(upload_dir, f"{file_hash}{ext}")
+
+def find_stored_path(document_id, upload_dir=UPLOAD_DIR):
+    """Locate the stored file for a document ID, or None if it was never uploaded"""
+    if not document_id or not DOCUMENT_ID_PATTERN.fullmatch(document_id):
+        return None
+    matches = glob.glob(os.path.join(upload_dir, f"{document_id}.*"))
+    return matches[0] if matches else None
+
+def store_upload(file_obj, filename, upload_dir=UPLOAD_DIR):
+    """
+    Stream an uploaded file into content-addressed storage.
+
+    Each block is hashed while it is written to a temp file in the upload
+    directory, which is then atomically renamed to its content address, so
+    the upload is read exactly once and memory use does not depend on size.
+
+    Returns (file_location, file_hash, created) where `created` is False when
+    identical content was already stored.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    md5 = hashlib.md5()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            for block in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+                md5.update(block)
+                buffer.write(block)
+
+        file_hash = md5.hexdigest()
+        file_location = get_stored_path(file_hash, filename, upload_dir)
+
+        if os.path.exists(file_location):
+            os.remove(tmp_path)
+            return file_location, file_hash, False
+
+        os.replace(tmp_path, file_location)
+        return file_location, file_hash, True
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_file_identity(file_path):
+    """Cheap identity of a file on disk: (path, inode, mtime, size)"""
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class DocumentRegistry:
+    """
+    Registry of content hashes keyed by file identity.
+
+    The hash is computed once (normally at upload time, where it comes for
+    free from the streaming write) and every later lookup is a stat() plus a
+    dict access, so request handlers get a document ID without re-reading
+    the file. Any change to the file's inode, mtime or size misses and
+    re-hashes.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, file_path, file_hash):
+        """Record the content hash of a file that was just written"""
+        try:
+            key = get_file_identity(file_path)
+        except OSError as e:
+            logger.error(f"Error registering document: {e}")
+            return None
+        with self._lock:
+            self._hashes[key] = file_hash
+            self._hashes.move_to_end(key)
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+        return file_hash
+
+    def get_document_id(self, file_path):
+        """Return the content hash of a file, hashing it only on a registry miss"""
+        try:
+            key = get_file_identity(file_path)
+        except OSError as e:
+            logger.error(f"Error getting document identity: {e}")
+            return None
+        with self._lock:
+            file_hash = self._hashes.get(key)
+            if file_hash is not None:
+                self._hashes.move_to_end(key)
+                return file_hash
+
+        file_hash = get_file_hash(file_path)
+        if file_hash:
+            self.register(file_path, file_hash)
+        return file_hash
+
+
+class DocumentSession:
+    """Per-document artifacts: extracted text, chunks, embeddings, FAISS and BM25 indexes, sentence index and challenge Q&A"""
+
+    def __init__(self, document_id, file_path):
+        self.document_id = document_id
+        self.file_path = file_path
+        self.text = None
+        self.structured_chunks = []
+        self.embeddings = None
+        self.index = None
+        self.sparse_index = None
+        self.chunk_positions = {}
+        self.sentence_index = None
+        self.challenge_qas = {}  # num_questions -> [(question, expected answer)]
+        # Serializes expensive builds (index, questions) for this document only
+        self.lock = threading.RLock()
+
+
+class SessionRegistry:
+    """
+    Bounded LRU registry of DocumentSession objects keyed by document ID.
+
+    Each document keeps its own index and challenge state, so concurrent
+    users working on different documents never evict or rebuild each
+    other's artifacts. Evicted sessions are recreated on demand from the
+    content-addressed upload directory.
+    """
+
+    def __init__(self, max_size=MAX_SESSIONS, upload_dir=UPLOAD_DIR):
+        self.max_size = max_size
+        self.upload_dir = upload_dir
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, document_id, file_path):
+        """Return the session for a document, creating it if needed"""
+        with self._lock:
+            session = self._sessions.get(document_id)
+            if session is None:
+                session = DocumentSession(document_id, file_path)
+                self._sessions[document_id] = session
+            self._sessions.move_to_end(document_id)
+            while len(self._sessions) > self.max_size:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                logger.info(f"Evicted document session {evicted_id}")
+            return session
+
+    def get_open(self, document_id):
+        """Return the session if it is already open, without touching the disk"""
+        with self._lock:
+            session = self._sessions.get(document_id)
+            if session is not None:
+                self._sessions.move_to_end(document_id)
+            return session
+
+    def get(self, document_id):
+        """Return the session for a stored document, or None if unknown"""
+        with self._lock:
+            session = self._sessions.get(document_id)
+            if session is not None:
+                self._sessions.move_to_end(document_id)
+                return session
+
+        file_path = find_stored_path(document_id, self.upload_dir)
+        if not file_path:
+            return None
+        return self.open(document_id, file_path)
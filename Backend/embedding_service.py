@@ -0,0 +1,154 @@
+"""
+Shared sentence-embedding service.
+
+One SentenceTransformer instance is loaded for the whole backend and used by
+retrieval (askanything), keyword extraction (KeyBERT) and answer similarity
+(challenge). Inputs are sorted by token length and grouped into batches with
+a padded-token budget, so short and long texts are never padded together.
+Vectors are cached on disk by hash of model ID + normalized text, so only
+texts never seen before reach the model. The model itself is loaded on
+first use (see models.py).
+"""
+
+import re
+import hashlib
+import logging
+import threading
+import numpy as np
+from stores import EmbeddingStore
+from models import ModelHandle
+from inference import get_model_variant, optimize_encoder
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Model + inference backend: cached vectors and indexes of different numerics never mix
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME + get_model_variant()
+MAX_BATCH_TOKENS = 16384  # padded tokens per forward pass
+MAX_BATCH_SIZE = 256
+
+def load_encoder():
+    from sentence_transformers import SentenceTransformer
+    return optimize_encoder(SentenceTransformer(EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME)
+
+# Shared model, loaded on first use or by the warm-up in main.py
+encoder_handle = ModelHandle("encoder", load_encoder)
+
+def get_encoder():
+    """The shared SentenceTransformer, or None if it failed to load"""
+    return encoder_handle.get()
+
+try:
+    embedding_store = EmbeddingStore()
+except Exception as e:
+    logger.error(f"Failed to open embedding store: {e}")
+    embedding_store = None
+
+# Embedding cache counters (texts served from the store vs. encoded)
+cache_stats = {"hits": 0, "misses": 0}
+cache_stats_lock = threading.Lock()
+
+def get_cache_key(text, model_name=EMBEDDING_MODEL_ID):
+    """Cache key for a text: hash of model ID + whitespace-normalized text"""
+    normalized = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha1(f"{model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+def get_cache_stats():
+    """Embedding cache hit/miss counters and hit rate since startup"""
+    with cache_stats_lock:
+        hits, misses = cache_stats["hits"], cache_stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else 0.0}
+
+def get_token_lengths(texts):
+    """Token count of each text, capped at the encoder's max sequence length"""
+    encoder = get_encoder()
+    encoded = encoder.tokenizer(texts, truncation=True, max_length=encoder.max_seq_length)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+def make_batches(lengths, max_batch_tokens=MAX_BATCH_TOKENS, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Group text positions into batches, longest first.
+
+    Within a sorted batch every row is padded to the first (longest) row, so
+    a batch is closed once `rows * longest` would exceed the token budget.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    batch = []
+    for position in order:
+        longest = lengths[batch[0]] if batch else lengths[position]
+        if batch and ((len(batch) + 1) * longest > max_batch_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(position)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def encode_uncached(texts, dtype=np.float32, normalize=False, max_batch_tokens=MAX_BATCH_TOKENS):
+    """Run the encoder over texts in length-sorted, token-budgeted batches"""
+    encoder = get_encoder()
+    embeddings = None
+    for batch in make_batches(get_token_lengths(texts), max_batch_tokens):
+        vectors = encoder.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            normalize_embeddings=normalize,
+        )
+        if embeddings is None:
+            embeddings = np.empty((len(texts), vectors.shape[1]), dtype=dtype)
+        embeddings[batch] = vectors
+    return embeddings
+
+def encode(texts, dtype=np.float32, normalize=False, use_cache=True):
+    """
+    Encode texts into a (len(texts), dim) matrix in the original order.
+
+    Pass dtype=np.float16 to halve the memory of large embedding matrices.
+    Cached vectors are stored unnormalized, so normalize is applied here.
+    Returns None if the encoder is not available.
+    """
+    encoder = get_encoder()
+    if encoder is None:
+        logger.error("SentenceTransformer model not available")
+        return None
+    dim = encoder.get_sentence_embedding_dimension()
+    if not texts:
+        return np.zeros((0, dim), dtype=dtype)
+
+    if not use_cache or embedding_store is None:
+        return encode_uncached(texts, dtype, normalize)
+
+    keys = [get_cache_key(text) for text in texts]
+    try:
+        cached = embedding_store.get_many(list(set(keys)))
+    except Exception as e:
+        logger.error(f"Error reading embedding store: {e}")
+        cached = {}
+
+    # Encode each distinct missing text once
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        vectors = encode_uncached(list(missing.values()))
+        new_items = list(zip(missing.keys(), vectors))
+        cached.update(new_items)
+        try:
+            embedding_store.put_many(new_items)
+        except Exception as e:
+            logger.error(f"Error writing embedding store: {e}")
+
+    with cache_stats_lock:
+        cache_stats["hits"] += len(texts) - len(missing)
+        cache_stats["misses"] += len(missing)
+
+    embeddings = np.stack([cached[key] for key in keys]).astype(dtype, copy=False)
+    if normalize:
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return embeddings
@@ -0,0 +1,100 @@
+"""
+Page-level PDF text extraction.
+
+Kept free of model imports so process-pool workers start quickly on every
+platform. Workers are always spawned, never forked: the server process is
+multi-threaded and holds model weights, and forking it risks deadlocks in
+the child. Spawned workers re-import this module, not upload.py.
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
+from pdfminer.layout import LAParams
+from pdfminer.converter import TextConverter
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+PAGES_PER_TASK = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Shared process pool for PDF extraction, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def count_pdf_pages(file_path):
+    """Number of pages in a PDF (walks the page tree without parsing content)"""
+    with open(file_path, 'rb') as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+def iter_page_range(file_path, first_page, last_page):
+    """
+    Yield pages [first_page, last_page) of a PDF as {"page_number", "text", "seconds"}.
+
+    Page text is identical to what pdfminer's extract_text produces for that
+    page (including the trailing form feed), so joining all pages reproduces
+    the whole-document output.
+    """
+    page_numbers = list(range(first_page, last_page))
+    resource_manager = PDFResourceManager(caching=True)
+    laparams = LAParams()
+
+    with open(file_path, 'rb') as fp:
+        for page_number, page in zip(page_numbers, PDFPage.get_pages(fp, pagenos=set(page_numbers))):
+            start_time = time.perf_counter()
+            output = StringIO()
+            device = TextConverter(resource_manager, output, codec='utf-8', laparams=laparams)
+            PDFPageInterpreter(resource_manager, device).process_page(page)
+            device.close()
+            yield {
+                "page_number": page_number,
+                "text": output.getvalue(),
+                "seconds": time.perf_counter() - start_time
+            }
+
+def extract_page_range(file_path, first_page, last_page):
+    """Process-pool task: extract a range of pages into a list"""
+    return list(iter_page_range(file_path, first_page, last_page))
+
+def iter_pdf_pages(file_path, pages_per_task=PAGES_PER_TASK):
+    """
+    Yield the pages of a PDF in order while later pages are still parsing.
+
+    The page list is split into ranges of `pages_per_task` that are extracted
+    across the shared process pool; results are yielded as soon as the next
+    range in document order is ready. Small documents (or single-core hosts)
+    are extracted inline, one page at a time.
+    """
+    start_time = time.time()
+    page_count = count_pdf_pages(file_path)
+    ranges = [(first, min(first + pages_per_task, page_count)) for first in range(0, page_count, pages_per_task)]
+
+    if len(ranges) <= 1 or EXTRACTION_WORKERS == 1:
+        results = [iter_page_range(file_path, 0, page_count)]
+    else:
+        executor = get_executor()
+        futures = [executor.submit(extract_page_range, file_path, first, last) for first, last in ranges]
+        results = (future.result() for future in futures)
+
+    for pages in results:
+        for page in pages:
+            logger.debug(f"Page {page['page_number'] + 1}/{page_count} extracted in {page['seconds']:.3f} seconds")
+            yield page
+
+    end_time = time.time()
+    logger.info(f"Extracted {page_count} pages in {end_time - start_time:.2f} seconds")
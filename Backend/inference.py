@@ -0,0 +1,155 @@
+"""
+Selectable inference backend for the CPU models.
+
+INFERENCE_BACKEND = "torch" runs the models in eager PyTorch (the default).
+"onnx" exports the sentence encoder and the extractive QA model to ONNX
+once (under uploads/.cache/onnx/) and runs them with onnxruntime behind
+the same forward() interface, so SentenceTransformer, KeyBERT and
+extract_answers are unchanged. QUANTIZE_INT8 adds dynamic int8
+quantization of the weights: onnxruntime's quantize_dynamic for exported
+models, torch.ao dynamic quantization of nn.Linear layers otherwise.
+
+The T5 summarizer and question generator use `generate()`, which has no
+plain-onnxruntime equivalent here, so they always stay in PyTorch and only
+take the int8 option. `python benchmark.py inference` checks accuracy
+parity against fp32 PyTorch and compares latency.
+"""
+
+import os
+import logging
+import threading
+
+from documents import CACHE_DIR
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = "torch"  # "torch" or "onnx"
+QUANTIZE_INT8 = False
+ONNX_DIR = os.path.join(CACHE_DIR, "onnx")
+ONNX_OPSET = 17
+
+_export_lock = threading.Lock()
+
+def get_model_variant(backend=None, quantize=None):
+    """Suffix identifying the numerics of a backend, e.g. "" (fp32 torch), "-onnx-int8" """
+    backend = INFERENCE_BACKEND if backend is None else backend
+    quantize = QUANTIZE_INT8 if quantize is None else quantize
+    suffix = "" if backend == "torch" else f"-{backend}"
+    return suffix + ("-int8" if quantize else "")
+
+def quantize_torch_model(model):
+    """Dynamic int8 quantization of every nn.Linear (weights int8, activations quantized per batch)"""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxModel:
+    """
+    An exported ONNX graph called like the Hugging Face model it replaces.
+
+    Returns a ModelOutput with the graph's named outputs as torch tensors.
+    The onnxruntime session is created lazily per process, so models
+    preloaded by serve.py never carry a thread pool across fork().
+    """
+
+    def __init__(self, path, config, output_names):
+        self.path = path
+        self.config = config
+        self.output_names = output_names
+        self.session = None
+        self.session_pid = None
+        self.lock = threading.Lock()
+
+    def get_session(self):
+        import onnxruntime as ort
+        import torch
+        with self.lock:
+            if self.session is None or self.session_pid != os.getpid():
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = torch.get_num_threads()
+                self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+                self.session_pid = os.getpid()
+            return self.session
+
+    def __call__(self, return_dict=True, **inputs):
+        import torch
+        from transformers.utils import ModelOutput
+        session = self.get_session()
+        feed = {arg.name: inputs[arg.name].cpu().numpy() for arg in session.get_inputs()}
+        outputs = session.run(self.output_names, feed)
+        return ModelOutput(**{name: torch.from_numpy(value) for name, value in zip(self.output_names, outputs)})
+
+    def eval(self):
+        return self
+
+
+def export_onnx(model, tokenizer, model_name, output_names, quantize):
+    """Export a Hugging Face model to ONNX (and int8) once; returns the path to run"""
+    import torch
+
+    model_dir = os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model-int8.onnx")
+    path = int8_path if quantize else fp32_path
+
+    with _export_lock:
+        if os.path.exists(path):
+            return path
+        os.makedirs(model_dir, exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            logger.info(f"Exporting {model_name} to ONNX...")
+            sample = tokenizer(["an example input", "another, slightly longer example input"], padding=True, return_tensors="pt")
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+            dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + output_names}
+            temp_path = f"{fp32_path}.{os.getpid()}.tmp"
+            model.eval()
+            with torch.inference_mode():
+                torch.onnx.export(
+                    model, tuple(sample[name] for name in input_names), temp_path,
+                    input_names=input_names, output_names=output_names,
+                    dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, dynamo=False
+                )
+            os.replace(temp_path, fp32_path)
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info(f"Quantizing {model_name} to int8...")
+            temp_path = f"{int8_path}.{os.getpid()}.tmp"
+            quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QInt8)
+            os.replace(temp_path, int8_path)
+    return path
+
+def optimize_encoder(encoder, model_name, backend=None, quantize=None):
+    """Apply the selected backend to a SentenceTransformer in place"""
+    backend = INFERENCE_BACKEND if backend is None else backend
+    quantize = QUANTIZE_INT8 if quantize is None else quantize
+    if backend == "onnx":
+        transformer = encoder[0]
+        path = export_onnx(transformer.auto_model, transformer.tokenizer, model_name, ["last_hidden_state"], quantize)
+        onnx_model = OnnxModel(path, transformer.auto_model.config, ["last_hidden_state"])
+        # Unregister the torch submodule; a plain object cannot take its place in _modules
+        del transformer.auto_model
+        transformer.auto_model = onnx_model
+    elif quantize:
+        encoder = quantize_torch_model(encoder)
+    return encoder
+
+def optimize_qa_pipeline(qa_pipeline, model_name, backend=None, quantize=None):
+    """Apply the selected backend to a question-answering pipeline in place"""
+    backend = INFERENCE_BACKEND if backend is None else backend
+    quantize = QUANTIZE_INT8 if quantize is None else quantize
+    if backend == "onnx":
+        output_names = ["start_logits", "end_logits"]
+        path = export_onnx(qa_pipeline.model, qa_pipeline.tokenizer, model_name, output_names, quantize)
+        qa_pipeline.model = OnnxModel(path, qa_pipeline.model.config, output_names)
+    elif quantize:
+        qa_pipeline.model = quantize_torch_model(qa_pipeline.model)
+    return qa_pipeline
+
+def optimize_seq2seq(model, quantize=None):
+    """T5 models stay in PyTorch; int8 dynamic quantization when enabled"""
+    quantize = QUANTIZE_INT8 if quantize is None else quantize
+    return quantize_torch_model(model) if quantize else model
@@ -1,60 +1,66 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Query, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import shutil
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
+from contextlib import asynccontextmanager
 import os
 import hashlib
+import json
 import time
 import logging
 import state
-from state import uploaded_file_path
 
-from upload import generate_summary
-from askanything import get_answer_with_justification, reset_document_index
-from challenge import generate_questions_and_answers, evaluate_user_answers
+from documents import UPLOAD_DIR, store_upload
+from stores import SharedCache
+from upload import generate_summary, iter_document_summary, is_cacheable_summary
+from askanything import (
+    search_questions, retrieve_chunks_batch, answer_retrieved_batch, question_batcher, qa_batcher,
+    update_document_index, get_retrieval_signature, QA_BATCH_QUESTIONS, RETRIEVAL_MODE, UNCACHEABLE_ANSWERS
+)
+from embedding_service import get_cache_stats
+from challenge import generate_questions_and_answers, evaluate_user_answers, CHALLENGE_QUESTIONS, MAX_CHALLENGE_QUESTIONS
+from sentence_index import get_sentence_index
+from corpus import get_corpus, search_corpus, get_corpus_stats, SEARCH_TOP_K, MAX_SEARCH_TOP_K
+from workers import PoolBusyError, pools, get_pool_stats
+from models import get_model_states, is_ready, warm_up
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-summary_cache = {}
-qa_cache = {}
-challenge_cache = {}
-file_hash_cache = {}
 MAX_CACHE_SIZE = 100  
 
-def get_file_hash(file_path):
-    """Calculate MD5 hash of a file for caching"""
-    try:
-        with open(file_path, 'rb') as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
-        return file_hash
-    except Exception as e:
-        logger.error(f"Error calculating file hash: {e}")
-        return None
+# Shared by every worker process (SQLite), least recently used entries evicted past MAX_CACHE_SIZE;
+# values never change once written, so each process keeps a read-through copy of its hits
+summary_cache = SharedCache("summary", state.cache_store, MAX_CACHE_SIZE, read_through=True)
+qa_cache = SharedCache("qa", state.cache_store, MAX_CACHE_SIZE, read_through=True)
+challenge_cache = SharedCache("challenge", state.cache_store, MAX_CACHE_SIZE, read_through=True)
 
 def get_question_hash(question):
     """Calculate hash of a question for caching"""
     return hashlib.md5(question.encode()).hexdigest()
 
-def cleanup_cache(cache_dict, max_size=MAX_CACHE_SIZE):
-    """Remove oldest entries from cache if it exceeds max size"""
-    if len(cache_dict) > max_size:
-        # Keep only the most recent entries
-        items = list(cache_dict.items())
-        cache_dict.clear()
-        cache_dict.update(items[-max_size:])
+def get_challenge_cache_key(document_id, num_questions):
+    return f"{document_id}_{num_questions}"
+
+def get_qa_cache_key(document_id, question, mode):
+    """Answers depend on the retriever, so the mode is part of the key"""
+    return f"{document_id}_{get_question_hash(question)}_{mode}"
+
+WARM_UP_MODELS = True  # load every model in the background right after startup
+WARM_UP_ORDER = ("encoder", "qa", "keybert", "question_generation", "summarizer")  # most used first
 
-def cleanup_all_caches():
-    """Clean up all caches periodically"""
-    cleanup_cache(summary_cache)
-    cleanup_cache(qa_cache)
-    cleanup_cache(challenge_cache)
-    cleanup_cache(file_hash_cache)
+@asynccontextmanager
+async def lifespan(app):
+    # Models load lazily; the port is bound before any of them is constructed
+    if WARM_UP_MODELS:
+        warm_up(WARM_UP_ORDER)
+    yield
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 
@@ -66,127 +72,267 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PoolBusyError)
+async def pool_busy_handler(request: Request, exc: PoolBusyError):
+    """Backpressure: a full worker pool answers 429 instead of queueing without bound"""
+    logger.warning(str(exc))
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "pool": exc.pool_name},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+def carry_over_qa_cache(previous, session):
+    """
+    Copy cached answers from the previous revision of a document to the new one.
+
+    An answer is kept only if the question still retrieves the same chunks
+    (same text, section and paragraph number) from the new revision;
+    everything else is left to be recomputed on demand.
+    """
+    prefix = f"{previous.document_id}_"
+    kept = 0
+    for cache_key, result in qa_cache.items(prefix):
+        question = result["question"]
+        mode = cache_key.rsplit("_", 1)[-1]
+        if get_retrieval_signature(question, previous, mode=mode) == get_retrieval_signature(question, session, mode=mode):
+            qa_cache[f"{session.document_id}_{cache_key[len(prefix):]}"] = result
+            kept += 1
+    logger.info(f"Carried over {kept} cached answers to the new revision")
+
+async def index_sentences(session):
+    """Ingestion-time sentence index build; left to first use when the pool is busy"""
+    try:
+        await pools["embed"].run(get_sentence_index, session)
+    except PoolBusyError:
+        logger.info("Embedding pool busy - sentence index will be built on first use")
+
+async def index_corpus(session, filename, metadata, replaces=None):
+    """Add an upload to the cross-document corpus; a new revision replaces its predecessor in search"""
+    def add():
+        corpus = get_corpus()
+        if corpus.add_document(session, filename, metadata, replaces) and replaces and replaces != session.document_id:
+            corpus.remove_document(replaces)
+
+    try:
+        await pools["embed"].run(add)
+    except PoolBusyError:
+        logger.warning(f"Embedding pool busy - {session.document_id} not added to the corpus")
+    except Exception as e:
+        logger.error(f"Error adding {session.document_id} to the corpus: {e}")
+
+def parse_metadata(metadata):
+    """Upload metadata: a JSON object of string values, or None if malformed"""
+    try:
+        parsed = json.loads(metadata)
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict) or not all(isinstance(value, str) for value in parsed.values()):
+        return None
+    return parsed
+
+def format_sse(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(events):
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def cache_get(cache, key):
+    """Cache lookup that never blocks the event loop: this process's copy, else the shared store on a thread"""
+    value = cache.get_local(key)
+    if value is None:
+        value = await run_in_threadpool(cache.get, key)
+    return value
+
+async def cache_set(cache, key, value):
+    await run_in_threadpool(cache.__setitem__, key, value)
+
+async def cache_answer(cache_key, result):
+    """Answers from a missing QA model or an empty retrieval are recomputed next time"""
+    if result["answer"] not in UNCACHEABLE_ANSWERS:
+        await cache_set(qa_cache, cache_key, result)
+
+async def cache_summary(document_id, summary):
+    """Missing-model, missing-file and error summaries are regenerated next time"""
+    if is_cacheable_summary(summary):
+        await cache_set(summary_cache, document_id, summary)
+
+async def encode_query(question, mode="dense"):
+    """Micro-batched query embedding as a one-row matrix; None for sparse retrieval or without an encoder"""
+    if mode == "sparse":
+        return None
+    q_embedding = await question_batcher.run(question)
+    return None if q_embedding is None else q_embedding[None, :]
+
+def resolve_session(document_id=None):
+    """Resolve the document session for a request, defaulting to the latest upload"""
+    if document_id is None:
+        uploaded_file_path = state.get_uploaded_file_path()
+        if not uploaded_file_path or not os.path.exists(uploaded_file_path):
+            return None
+        document_id = state.document_registry.get_document_id(uploaded_file_path)
+    return state.sessions.get(document_id)
+
+async def get_session(document_id=None):
+    """Open sessions are resolved in place; anything touching the shared store or disk runs on a thread"""
+    if document_id is not None:
+        session = state.sessions.get_open(document_id)
+        if session is not None:
+            return session
+    return await run_in_threadpool(resolve_session, document_id)
+
 # ---- ROUTES ---- #
 
-UPLOAD_DIR = r"D:\GenAI\Backend\uploads"
 @app.post("/upload/")
-def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    metadata: Optional[str] = Form(None),
+    replaces: Optional[str] = Form(None)
+):
     start_time = time.time()
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    
-    # Check if file already exists and is identical
-    file_uploaded = False
-    if os.path.exists(file_location):
-        # Calculate hash of uploaded file
-        file.file.seek(0)
-        uploaded_content = file.file.read()
-        uploaded_hash = hashlib.md5(uploaded_content).hexdigest()
-        
-        # Calculate hash of existing file
-        existing_hash = get_file_hash(file_location)
-        
-        if uploaded_hash == existing_hash:
-            logger.info(f"File {file.filename} already exists and is identical - skipping upload")
-            file_uploaded = False
-        else:
-            # File is different, overwrite it
-            file.file.seek(0)
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            file_uploaded = True
-    else:
-        # File doesn't exist, save it
-        file.file.seek(0)
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        file_uploaded = True
-
-    # ✅ Save to global variable
-    state.uploaded_file_path = file_location
-    
-    # Reset document index for new file (only if file was actually uploaded)
-    if file_uploaded:
-        reset_document_index()
-        
-        file_hash = get_file_hash(file_location)
-        if file_hash:
-            summary_cache.pop(file_hash, None)
-            challenge_cache.pop(file_hash, None)
-           
-            qa_cache.clear()  
-    
-    
-    if len(summary_cache) + len(qa_cache) + len(challenge_cache) > MAX_CACHE_SIZE * 2:
-        cleanup_all_caches()
+
+    # Searchable corpus metadata, e.g. {"team": "legal"}; when omitted, a revision keeps its predecessor's
+    document_metadata = None
+    if metadata is not None:
+        document_metadata = parse_metadata(metadata)
+        if document_metadata is None:
+            return JSONResponse(status_code=400, content={"detail": "metadata must be a JSON object of string values"})
+
+    # A revision is only ever declared by the client: file names are not unique across users
+    previous = None
+    if replaces is not None:
+        previous = await get_session(replaces)
+        if previous is None:
+            return JSONResponse(status_code=400, content={"detail": "replaces must be the document_id of an uploaded document"})
+
+    # Stream to content-addressed storage, hashing each block as it is written
+    file.file.seek(0)
+    file_location, file_hash, file_uploaded = await run_in_threadpool(store_upload, file.file, file.filename, UPLOAD_DIR)
+    if not file_uploaded:
+        logger.info(f"File {file.filename} already exists and is identical - skipping upload")
+
+    # ✅ Register the document and make it the default for requests without an ID
+    state.document_registry.register(file_location, file_hash)
+    session = state.sessions.open(file_hash, file_location)
+    await run_in_threadpool(state.set_uploaded_file_path, file_location)
+
+    # A new revision of a document: re-index only the changed chunks
+    previous_id = previous.document_id if previous is not None and previous.document_id != file_hash else None
+    if file_uploaded and previous_id:
+        if await pools["embed"].run(update_document_index, session, previous) is not None:
+            await pools["embed"].run(carry_over_qa_cache, previous, session)
+    
+    # Justification lookup index and corpus entry, built after the response is sent
+    background_tasks.add_task(index_sentences, session)
+    background_tasks.add_task(index_corpus, session, file.filename, document_metadata, previous.document_id if previous is not None else None)
     
     end_time = time.time()
     logger.info(f"Upload processed in {end_time - start_time:.2f} seconds")
     
-    return {"message": "File uploaded successfully", "path": file_location}
+    return {"message": "File uploaded successfully", "path": file_location, "document_id": file_hash}
 
 @app.get("/upload/")
-def extract_text_api():
+async def extract_text_api(document_id: Optional[str] = None):
     start_time = time.time()
     
-    # Check if file exists
-    if not state.uploaded_file_path or not os.path.exists(state.uploaded_file_path):
+    # Resolve the document session
+    session = await get_session(document_id)
+    if session is None:
         return {"summary": "No file uploaded yet."}
     
-    # Get file hash for caching
-    file_hash = get_file_hash(state.uploaded_file_path)
-    if not file_hash:
-        return {"summary": "Error processing file."}
-    
     # Check cache first
-    if file_hash in summary_cache:
+    summary = await cache_get(summary_cache, session.document_id)
+    if summary is not None:
         end_time = time.time()
         logger.info(f"Summary cache hit - returned in {end_time - start_time:.2f} seconds")
-        return {"summary": summary_cache[file_hash]}
+        return {"summary": summary}
     
     # Generate summary and cache it
-    summary = generate_summary()
-    summary_cache[file_hash] = summary
+    summary = await pools["summarize"].run(generate_summary, session)
+    await cache_summary(session.document_id, summary)
     
     end_time = time.time()
     logger.info(f"Summary generated and cached in {end_time - start_time:.2f} seconds")
     
     return {"summary": summary}
 
+@app.get("/upload/stream")
+async def stream_summary(document_id: Optional[str] = None):
+    """
+    Server-sent-event variant of GET /upload/.
+
+    Emits a `map` event per chunk summary as it finishes ({"done", "total",
+    "summary"}), a `reduce` event per reduction round ({"level", "parts"})
+    and a final `summary` event ({"summary"}). Cache hits send only the
+    `summary` event.
+    """
+    start_time = time.time()
+    session = await get_session(document_id)
+    if session is None:
+        return event_stream(iter([format_sse("summary", {"summary": "No file uploaded yet."})]))
+
+    summary = await cache_get(summary_cache, session.document_id)
+    if summary is not None:
+        logger.info(f"Summary cache hit - returned in {time.time() - start_time:.2f} seconds")
+        return event_stream(iter([format_sse("summary", {"summary": summary})]))
+
+    # Take the pool slot before the response starts, so a full pool still answers 429
+    stages = pools["summarize"].iterate(iter_document_summary, session)
+
+    async def generate():
+        async for stage, result in stages:
+            if stage == "final":
+                await cache_summary(session.document_id, result)
+                logger.info(f"Summary streamed and cached in {time.time() - start_time:.2f} seconds")
+                yield format_sse("summary", {"summary": result})
+            else:
+                yield format_sse(stage, result)
+
+    return event_stream(generate())
+
+
+RetrievalMode = Literal["dense", "sparse", "hybrid"]
 
 class AskRequest(BaseModel):
     question: str
+    document_id: Optional[str] = None
+    mode: Optional[RetrievalMode] = None  # defaults to askanything.RETRIEVAL_MODE
+
 
 @app.post("/askanything/")
-def ask_question(payload: AskRequest):
+async def ask_question(payload: AskRequest):
     start_time = time.time()
     
-    # Check if file exists
-    if not state.uploaded_file_path or not os.path.exists(state.uploaded_file_path):
+    # Resolve the document session
+    session = await get_session(payload.document_id)
+    if session is None:
         return {"question": payload.question, "answer": "Please upload a document first.", "justification": "No document available."}
     
-    # Get file hash and question hash for caching
-    file_hash = get_file_hash(state.uploaded_file_path)
-    question_hash = get_question_hash(payload.question)
-    cache_key = f"{file_hash}_{question_hash}"
-    
-    if not file_hash:
-        return {"question": payload.question, "answer": "Error processing file.", "justification": "File processing error."}
+    # Document ID, question hash and retrieval mode for caching
+    mode = payload.mode or RETRIEVAL_MODE
+    cache_key = get_qa_cache_key(session.document_id, payload.question, mode)
     
     # Check cache first
-    if cache_key in qa_cache:
+    cached = await cache_get(qa_cache, cache_key)
+    if cached is not None:
         end_time = time.time()
         logger.info(f"Q&A cache hit - returned in {end_time - start_time:.2f} seconds")
-        return qa_cache[cache_key]
+        return cached
     
     # Generate answer and cache it
-    answer, justification = get_answer_with_justification(payload.question)
+    # Encoding and span extraction are micro-batched with concurrent requests;
+    # the index search (and first-use index build) runs on the embedding pool
+    q_embeddings = await encode_query(payload.question, mode)
+    top_chunks = (await pools["embed"].run(search_questions, [payload.question], q_embeddings, session, 3, mode))[0]
+    answer, justification = await qa_batcher.run((payload.question, top_chunks))
     result = {
         "question": payload.question,
         "answer": answer,
         "justification": justification
     }
-    qa_cache[cache_key] = result
+    await cache_answer(cache_key, result)
     
     end_time = time.time()
     logger.info(f"Q&A generated and cached in {end_time - start_time:.2f} seconds")
@@ -194,40 +340,229 @@ def ask_question(payload: AskRequest):
     return result
 
 
+@app.post("/askanything/stream")
+async def stream_answer(payload: AskRequest):
+    """
+    Server-sent-event variant of POST /askanything/.
+
+    Emits `sources` (the retrieved sections and paragraphs) as soon as the
+    index search finishes, then `answer`, then `justification`, then `done`
+    ({"seconds"}). A pool that fills up mid-stream sends an `error` event
+    ({"error", "retry_after"}).
+    """
+    start_time = time.time()
+    session = await get_session(payload.document_id)
+    if session is None:
+        return event_stream(iter([
+            format_sse("answer", {"question": payload.question, "answer": "Please upload a document first."}),
+            format_sse("justification", {"justification": "No document available."}),
+            format_sse("done", {"seconds": 0.0})
+        ]))
+
+    mode = payload.mode or RETRIEVAL_MODE
+    cache_key = get_qa_cache_key(session.document_id, payload.question, mode)
+    cached = await cache_get(qa_cache, cache_key)
+    if cached is not None:
+        logger.info(f"Q&A cache hit - returned in {time.time() - start_time:.2f} seconds")
+        return event_stream(iter([
+            format_sse("answer", {"question": cached["question"], "answer": cached["answer"]}),
+            format_sse("justification", {"justification": cached["justification"]}),
+            format_sse("done", {"seconds": round(time.time() - start_time, 3)})
+        ]))
+
+    # Encode before the response starts, so a full batcher still answers 429
+    q_embeddings = await encode_query(payload.question, mode)
+
+    async def generate():
+        try:
+            top_chunks = (await pools["embed"].run(search_questions, [payload.question], q_embeddings, session, 3, mode))[0]
+            sources = [{"section": chunk["section"], "paragraph_number": chunk["paragraph_number"]} for chunk in top_chunks]
+            yield format_sse("sources", {"sources": sources})
+            answer, justification = await qa_batcher.run((payload.question, top_chunks))
+        except PoolBusyError as e:
+            yield format_sse("error", {"error": str(e), "retry_after": e.retry_after})
+            return
+
+        yield format_sse("answer", {"question": payload.question, "answer": answer})
+        await cache_answer(cache_key, {
+            "question": payload.question,
+            "answer": answer,
+            "justification": justification
+        })
+        yield format_sse("justification", {"justification": justification})
+        elapsed = time.time() - start_time
+        logger.info(f"Q&A streamed and cached in {elapsed:.2f} seconds")
+        yield format_sse("done", {"seconds": round(elapsed, 3)})
+
+    return event_stream(generate())
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    document_id: Optional[str] = None
+    mode: Optional[RetrievalMode] = None
+
+@app.post("/askanything/batch")
+async def ask_questions_batch(payload: AskBatchRequest):
+    """
+    Answer many questions about one document in batched passes.
+
+    Streams newline-delimited JSON: one {"index", "question", "answer",
+    "justification"} object per question as soon as it is ready (cache hits
+    first), then a {"summary": ...} object with the batch throughput.
+    """
+    start_time = time.time()
+    session = await get_session(payload.document_id)
+    if session is None:
+        results = [{"index": i, "question": question, "answer": "Please upload a document first.", "justification": "No document available."} for i, question in enumerate(payload.questions)]
+        return StreamingResponse((json.dumps(result) + "\n" for result in results), media_type="application/x-ndjson")
+
+    # Split cache hits from questions that need the models
+    mode = payload.mode or RETRIEVAL_MODE
+    hits = []
+    pending = []
+    for i, question in enumerate(payload.questions):
+        cache_key = get_qa_cache_key(session.document_id, question, mode)
+        cached = await cache_get(qa_cache, cache_key)
+        if cached is not None:
+            hits.append({"index": i, **cached})
+        else:
+            pending.append(i)
+
+    # Retrieve for every question before streaming, so a full pool still answers 429
+    questions = [payload.questions[i] for i in pending]
+    retrieved = await pools["embed"].run(retrieve_chunks_batch, questions, session, 3, mode) if questions else []
+
+    async def generate():
+        for hit in hits:
+            yield json.dumps(hit) + "\n"
+
+        for start in range(0, len(questions), QA_BATCH_QUESTIONS):
+            end = min(start + QA_BATCH_QUESTIONS, len(questions))
+            try:
+                answers = await pools["qa"].run(answer_retrieved_batch, questions[start:end], retrieved[start:end])
+            except PoolBusyError as e:
+                yield json.dumps({"error": str(e), "retry_after": e.retry_after}) + "\n"
+                return
+            for position, (answer, justification) in enumerate(answers, start):
+                result = {
+                    "question": questions[position],
+                    "answer": answer,
+                    "justification": justification
+                }
+                await cache_answer(get_qa_cache_key(session.document_id, questions[position], mode), result)
+                yield json.dumps({"index": pending[position], **result}) + "\n"
+
+        elapsed = time.time() - start_time
+        summary = {
+            "questions": len(payload.questions),
+            "cache_hits": len(hits),
+            "seconds": round(elapsed, 3),
+            "questions_per_second": round(len(payload.questions) / elapsed, 2) if elapsed > 0 else None
+        }
+        logger.info(f"Batch of {len(payload.questions)} questions answered in {elapsed:.2f} seconds")
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 
 @app.get("/challenge/")
-def get_generated_questions():
+async def get_generated_questions(document_id: Optional[str] = None, num_questions: int = Query(CHALLENGE_QUESTIONS, ge=1, le=MAX_CHALLENGE_QUESTIONS)):
     start_time = time.time()
     
-    # Check if file exists
-    if not state.uploaded_file_path or not os.path.exists(state.uploaded_file_path):
+    # Resolve the document session
+    session = await get_session(document_id)
+    if session is None:
         return {"questions": [{"question": "Please upload a document first."}]}
     
-    # Get file hash for caching
-    file_hash = get_file_hash(state.uploaded_file_path)
-    if not file_hash:
-        return {"questions": [{"question": "Error processing file."}]}
-    
-    # Check cache first
-    if file_hash in challenge_cache:
+    # Check cache first (restoring the expected answers if the session was evicted);
+    # each challenge size is cached separately, so clients asking for different sizes never clash
+    cache_key = get_challenge_cache_key(session.document_id, num_questions)
+    cached = await cache_get(challenge_cache, cache_key)
+    if cached is not None:
+        questions, challenge_qas = cached
+        session.challenge_qas.setdefault(num_questions, challenge_qas)
         end_time = time.time()
         logger.info(f"Challenge cache hit - returned in {end_time - start_time:.2f} seconds")
-        return {"questions": challenge_cache[file_hash]}
+        return {"questions": questions, "num_questions": num_questions}
     
-    # Generate questions and cache them
-    questions = generate_questions_and_answers()
-    challenge_cache[file_hash] = questions
+    # Generate questions and cache them (unless a concurrent request already did)
+    def generate():
+        with session.lock:
+            cached = challenge_cache.get(cache_key)
+            if cached is not None:
+                return cached[0]
+            questions = generate_questions_and_answers(session, num_questions)
+            challenge_qas = session.challenge_qas.get(num_questions)
+            if challenge_qas:
+                challenge_cache[cache_key] = (questions, challenge_qas)
+        return questions
+
+    questions = await pools["question_generation"].run(generate)
     
     end_time = time.time()
     logger.info(f"Challenge questions generated and cached in {end_time - start_time:.2f} seconds")
     
-    return {"questions": questions}
+    return {"questions": questions, "num_questions": num_questions}
 
 
 class ChallengeAnswer(BaseModel):
     user_answers: List[str]
+    document_id: Optional[str] = None
+    num_questions: int = Field(CHALLENGE_QUESTIONS, ge=1, le=MAX_CHALLENGE_QUESTIONS)  # the challenge being answered
 
 @app.post("/challenge/")
-def evaluate_answers(payload: ChallengeAnswer):
-    results = evaluate_user_answers(payload.user_answers)
+async def evaluate_answers(payload: ChallengeAnswer):
+    session = await get_session(payload.document_id)
+    if session is None:
+        return {"results": [{"question": "No questions available for evaluation.", "user_answer": "", "is_correct": False, "similarity": 0, "justification": "No document or questions available"}]}
+
+    # The questions may have been generated by another worker process
+    if payload.num_questions not in session.challenge_qas:
+        cached = await cache_get(challenge_cache, get_challenge_cache_key(session.document_id, payload.num_questions))
+        if cached is not None:
+            session.challenge_qas.setdefault(payload.num_questions, cached[1])
+
+    results = await pools["embed"].run(evaluate_user_answers, payload.user_answers, session, payload.num_questions)
     return {"results": results}
+
+
+class SearchFilters(BaseModel):
+    document_ids: Optional[List[str]] = None
+    filename: Optional[str] = None  # case-insensitive substring
+    metadata: Optional[Dict[str, str]] = None  # exact matches on upload metadata
+    uploaded_after: Optional[float] = None  # Unix time
+    uploaded_before: Optional[float] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = Field(SEARCH_TOP_K, ge=1, le=MAX_SEARCH_TOP_K)
+    filters: Optional[SearchFilters] = None
+
+@app.post("/search/")
+async def search_documents(payload: SearchRequest):
+    """Top-k chunks across every uploaded document, with document, section and paragraph"""
+    start_time = time.time()
+    filters = payload.filters.model_dump(exclude_none=True) if payload.filters else None
+
+    q_embedding = await encode_query(payload.query)
+    results = await pools["embed"].run(search_corpus, q_embedding, payload.k, filters) if q_embedding is not None else []
+    for rank, result in enumerate(results, start=1):
+        result["rank"] = rank
+
+    elapsed = time.time() - start_time
+    logger.info(f"Corpus search returned {len(results)} chunks in {elapsed:.2f} seconds")
+    return {"query": payload.query, "results": results, "seconds": round(elapsed, 4)}
+
+
+@app.get("/metrics/")
+async def get_metrics():
+    corpus_stats = await run_in_threadpool(get_corpus_stats)
+    return {"embedding_cache": get_cache_stats(), "worker_pools": get_pool_stats(), "models": get_model_states(), "corpus": corpus_stats}
+
+
+@app.get("/ready/")
+async def get_readiness():
+    """200 once every model is loaded, 503 (with per-model state) before that"""
+    ready = is_ready()
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "models": get_model_states()})
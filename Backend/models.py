@@ -0,0 +1,90 @@
+"""
+Lazily loaded, thread-safe model handles.
+
+Importing the backend no longer constructs any model: each model is wrapped
+in a ModelHandle that loads it on first `get()` (or in the background
+warm-up started by main.py), so uvicorn binds its port immediately.
+Concurrent callers block on the handle's lock until the single load
+finishes. `get_model_states()` feeds the readiness endpoint.
+"""
+
+import time
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NOT_LOADED, LOADING, READY, FAILED = "not_loaded", "loading", "ready", "failed"
+
+handles = {}  # ModelHandle instances register themselves by name, in warm-up order
+
+
+class ModelHandle:
+    """
+    A model constructed on first use.
+
+    `loader` is called at most once; its result is returned by every later
+    `get()`. If loading fails the error is logged and kept, and `get()`
+    returns None, matching the old module-level try/except behaviour.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.model = None
+        self.state = NOT_LOADED
+        self.error = None
+        self.seconds = None
+        self.lock = threading.Lock()
+        handles[name] = self
+
+    def get(self):
+        if self.state == READY:
+            return self.model
+        with self.lock:
+            if self.state == NOT_LOADED:
+                self.load()
+            return self.model
+
+    def load(self):
+        """Run the loader (caller holds the lock)"""
+        self.state = LOADING
+        logger.info(f"Loading {self.name} model...")
+        start_time = time.time()
+        try:
+            self.model = self.loader()
+            self.state = READY
+            logger.info(f"{self.name} model loaded in {time.time() - start_time:.2f} seconds")
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            logger.error(f"Failed to load {self.name} model: {e}")
+        self.seconds = round(time.time() - start_time, 3)
+
+    def get_state(self):
+        return {"state": self.state, "seconds": self.seconds, "error": self.error}
+
+
+def get_model_states():
+    """Load state, load time and error of every model"""
+    return {name: handle.get_state() for name, handle in handles.items()}
+
+def is_ready():
+    """True once every model has loaded successfully"""
+    return all(handle.state == READY for handle in handles.values())
+
+def warm_up(order=()):
+    """Load every registered model in a background thread; names in `order` go first"""
+    names = list(order) + [name for name in handles if name not in order]
+
+    def load_all():
+        start_time = time.time()
+        for name in names:
+            handles[name].get()
+        logger.info(f"Model warm-up finished in {time.time() - start_time:.2f} seconds")
+
+    thread = threading.Thread(target=load_all, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
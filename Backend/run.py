@@ -6,8 +6,15 @@ Run both FastAPI backend and Streamlit frontend with one command
 import subprocess
 import threading
 import time
+import json
 import sys
 import os
+import urllib.request
+import urllib.error
+
+READY_URL = "http://localhost:8000/ready/"
+READY_TIMEOUT = 300  # seconds to wait for the models before starting the frontend anyway
+READY_POLL_INTERVAL = 0.5
 
 def run_backend():
     """Start FastAPI backend server"""
@@ -19,6 +26,35 @@ def run_frontend():
     print("🎨 Starting Streamlit frontend...")
     subprocess.run([sys.executable, "-m", "streamlit", "run", "app.py"])
 
+def wait_for_backend(timeout=READY_TIMEOUT):
+    """Poll the readiness endpoint until every model is loaded (or one fails)"""
+    start_time = time.time()
+    last_states = None
+    while time.time() - start_time < timeout:
+        try:
+            with urllib.request.urlopen(READY_URL, timeout=2) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            # 503 while models are still loading
+            body = json.load(e)
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(READY_POLL_INTERVAL)
+            continue
+
+        states = {name: model["state"] for name, model in body["models"].items()}
+        if states != last_states:
+            print("   " + ", ".join(f"{name}: {model_state}" for name, model_state in states.items()))
+            last_states = states
+        if body["ready"]:
+            return True
+        if "failed" in states.values():
+            print("⚠️ Some models failed to load - see the backend log")
+            return False
+        time.sleep(READY_POLL_INTERVAL)
+
+    print(f"⚠️ Backend not ready after {timeout} seconds")
+    return False
+
 def main():
     """Main function to run both backend and frontend"""
     print("🚀 Starting GenAI Document Assistant...")
@@ -27,11 +63,11 @@ def main():
     backend_thread = threading.Thread(target=run_backend, daemon=True)
     backend_thread.start()
     
-    # Wait for backend to start
+    # Wait for backend to start and load its models
     print("⏳ Waiting for backend to start...")
-    time.sleep(5)
-    
-    print("✅ Backend started successfully!")
+    start_time = time.time()
+    if wait_for_backend():
+        print(f"✅ Backend ready in {time.time() - start_time:.1f} seconds!")
     print("🌐 Starting Streamlit frontend...")
     
     # Start Streamlit frontend in main thread
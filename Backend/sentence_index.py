@@ -0,0 +1,224 @@
+"""
+Per-document sentence store for justification lookup.
+
+Built once per document (in the background after upload, or on first use)
+and persisted under uploads/.cache/sentences/: character offsets of every
+sentence in the extracted text, an inverted token index in CSR form (sorted
+vocabulary, postings pointers, concatenated sentence IDs) and a normalized
+sentence-embedding matrix. Keyword lookup is a postings-list intersection;
+semantic lookup is one matrix-vector product. Nothing is re-split or
+re-encoded per request.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from itertools import chain
+
+import numpy as np
+
+from documents import CACHE_DIR
+from embedding_service import EMBEDDING_MODEL_ID, get_encoder, encode
+from upload import get_document_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SENTENCE_INDEX_DIR = os.path.join(CACHE_DIR, "sentences")
+MIN_SENTENCE_CHARS = 10  # shorter fragments are never shown as justification
+MIN_SENTENCE_SIMILARITY = 0.3
+SENTENCE_PATTERN = re.compile(r"[^.]+")  # sentences end at '.', like the justification text
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def split_sentences(text):
+    """(start, end) character offsets of the sentences of a text, whitespace trimmed"""
+    offsets = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group()
+        start = match.start() + len(sentence) - len(sentence.lstrip())
+        end = match.end() - (len(sentence) - len(sentence.rstrip()))
+        if end - start > MIN_SENTENCE_CHARS:
+            offsets.append((start, end))
+    return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+
+class SentenceIndex:
+    """
+    Sentences of one document with an inverted index and embedding matrix.
+
+    Sentence i is text[offsets[i, 0]:offsets[i, 1]]. The postings of
+    vocabulary[t] are postings[indptr[t]:indptr[t + 1]], ascending sentence
+    IDs. Embedding rows are L2-normalized, so dot products are cosines.
+    """
+
+    def __init__(self, text, offsets, vocabulary, indptr, postings, embeddings):
+        self.text = text
+        self.offsets = offsets
+        self.vocabulary = vocabulary
+        self.token_ids = {token: i for i, token in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.postings = postings
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def sentence(self, i):
+        start, end = self.offsets[i]
+        return self.text[start:end]
+
+    def get_postings(self, token):
+        i = self.token_ids.get(token)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.indptr[i]:self.indptr[i + 1]]
+
+    def containing_all(self, tokens):
+        """IDs of sentences containing every token (shortest postings list first)"""
+        lists = sorted((self.get_postings(token) for token in set(tokens)), key=len)
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        ids = lists[0]
+        for postings in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, postings, assume_unique=True)
+        return ids
+
+    def containing_any(self, tokens, query_embedding):
+        """IDs of sentences sharing a token, most shared tokens first, then most similar"""
+        lists = [self.get_postings(token) for token in set(tokens)]
+        if not any(len(postings) for postings in lists):
+            return np.empty(0, dtype=np.int32)
+        ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        similarities = self.embeddings[ids] @ query_embedding
+        return ids[np.lexsort((-similarities, -counts))]
+
+    def rank(self, ids, query_embedding):
+        """Sentence IDs ordered by similarity to a query"""
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids[np.argsort(-(self.embeddings[ids] @ query_embedding), kind="stable")]
+
+    def search(self, query_embedding, k, min_similarity=MIN_SENTENCE_SIMILARITY):
+        """Top-k sentence IDs by cosine similarity, best first"""
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64)
+        similarities = self.embeddings @ query_embedding
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(len(similarities))
+        top = top[np.argsort(-similarities[top])]
+        return top[similarities[top] > min_similarity]
+
+    def find_justification(self, phrase, phrase_embedding, limit=2):
+        """
+        Sentences supporting an expected answer: sentences containing the
+        phrase, else sentences sharing its keywords, else the most similar
+        sentences above MIN_SENTENCE_SIMILARITY.
+        """
+        query = np.asarray(phrase_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        tokens = tokenize(phrase)
+        phrase_lower = phrase.lower()
+
+        # Every token must occur; the postings do not guarantee they are adjacent
+        exact = [i for i in self.containing_all(tokens) if phrase_lower in self.sentence(i).lower()]
+        if exact:
+            ids = self.rank(exact, query)
+        else:
+            ids = self.containing_any(tokens, query)
+            if not len(ids):
+                ids = self.search(query, limit)
+        return [self.sentence(i) for i in ids[:limit]]
+
+
+def build_sentence_index(text):
+    """Split, index and encode the sentences of a document text"""
+    offsets = split_sentences(text)
+    sentences = [text[start:end] for start, end in offsets]
+
+    token_postings = {}
+    for i, sentence in enumerate(sentences):
+        for token in set(tokenize(sentence)):
+            token_postings.setdefault(token, []).append(i)
+    vocabulary = sorted(token_postings)
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(token_postings[token]) for token in vocabulary])
+    postings = np.fromiter(chain.from_iterable(token_postings[token] for token in vocabulary), dtype=np.int32, count=int(indptr[-1]))
+
+    # Stored here once per document, so the per-text embedding cache is bypassed
+    embeddings = encode(sentences, normalize=True, use_cache=False)
+    return SentenceIndex(text, offsets, vocabulary, indptr, postings, embeddings)
+
+def get_sentence_index_paths(document_id, model_name=EMBEDDING_MODEL_ID):
+    base = os.path.join(SENTENCE_INDEX_DIR, f"{document_id}_{model_name.replace('/', '--')}")
+    return {name: f"{base}.{name}.npy" for name in ("offsets", "indptr", "postings", "embeddings")}, base + ".vocab.json"
+
+def save_sentence_index(document_id, index):
+    """Persist a sentence index; each file is written to a temp name then renamed"""
+    os.makedirs(SENTENCE_INDEX_DIR, exist_ok=True)
+    array_paths, vocabulary_path = get_sentence_index_paths(document_id)
+
+    with open(vocabulary_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index.vocabulary, f)
+    os.replace(vocabulary_path + ".tmp", vocabulary_path)
+
+    # The embedding matrix is written last, so its presence marks a complete entry
+    for name in ("offsets", "indptr", "postings", "embeddings"):
+        with open(array_paths[name] + ".tmp", "wb") as f:
+            np.save(f, getattr(index, name))
+        os.replace(array_paths[name] + ".tmp", array_paths[name])
+
+def load_sentence_index(document_id, text):
+    """Memory-map a persisted sentence index, or None if the document has not been indexed"""
+    array_paths, vocabulary_path = get_sentence_index_paths(document_id)
+    if not os.path.exists(array_paths["embeddings"]):
+        return None
+
+    try:
+        with open(vocabulary_path, "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        arrays = {name: np.load(path, mmap_mode="r") for name, path in array_paths.items()}
+        return SentenceIndex(text, arrays["offsets"], vocabulary, arrays["indptr"], arrays["postings"], arrays["embeddings"])
+    except Exception as e:
+        logger.error(f"Error loading persisted sentence index: {e}")
+        return None
+
+def get_sentence_index(session):
+    """The sentence index of a document session, loaded or built once; None if unavailable"""
+    if session.sentence_index is not None:
+        return session.sentence_index
+    if get_encoder() is None:
+        logger.error("SentenceTransformer model not available")
+        return None
+
+    with session.lock:
+        if session.sentence_index is not None:
+            return session.sentence_index
+
+        text = get_document_text(session)
+        if text in ("No file uploaded yet.", "File not found.", "Unsupported file format.") or text.startswith("Error"):
+            return None
+
+        start_time = time.time()
+        index = load_sentence_index(session.document_id, text)
+        if index is not None:
+            logger.info(f"Sentence index loaded from disk in {time.time() - start_time:.2f} seconds")
+        else:
+            try:
+                index = build_sentence_index(text)
+            except Exception as e:
+                logger.error(f"Error building sentence index: {e}")
+                return None
+            try:
+                save_sentence_index(session.document_id, index)
+            except Exception as e:
+                logger.error(f"Error persisting sentence index: {e}")
+            logger.info(f"Sentence index of {len(index)} sentences built in {time.time() - start_time:.2f} seconds")
+
+        session.sentence_index = index
+        return index
@@ -0,0 +1,132 @@
+"""
+Production launcher: load the models once, then fork uvicorn workers.
+
+The master process imports the app, loads every model and binds the
+listening socket, then forks `--workers` children that all accept on that
+socket. Model weights live in tensor storage that the children only read,
+so the pages stay shared copy-on-write instead of being loaded N times.
+Caches and the latest-upload state live in SQLite (stores.CacheStore) and
+document indexes are memory-mapped from disk, so any worker can serve any
+document.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000]
+
+Platforms without fork (Windows) fall back to uvicorn's own multi-process
+mode, where every worker loads its own copy of the models.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import logging
+
+import uvicorn
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def preload_models():
+    """Import the app and load every model in the master process"""
+    import main
+    from models import handles, is_ready
+
+    # The children must not each start a warm-up of their own
+    main.WARM_UP_MODELS = False
+    start_time = time.time()
+    for handle in handles.values():
+        handle.get()
+    if not is_ready():
+        logger.warning("Some models failed to load; workers will report them as failed")
+    logger.info(f"Models preloaded in {time.time() - start_time:.2f} seconds")
+    return main.app
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock, threads):
+    """Child process: split the cores between workers and serve on the shared socket"""
+    import torch
+    torch.set_num_threads(threads)
+    config = uvicorn.Config(app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def spawn_worker(app, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        # Never return into the master's code; a crash must reach the supervisor as a failure
+        status = 1
+        try:
+            run_worker(app, sock, threads)
+            status = 0
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} crashed")
+        finally:
+            os._exit(status)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+def serve_forked(host, port, workers):
+    app = preload_models()
+    sock = bind_socket(host, port)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Objects created so far are never collected, so the GC does not
+    # touch (and un-share) their pages in the children
+    gc.collect()
+    gc.freeze()
+
+    children = {spawn_worker(app, sock, threads) for _ in range(workers)}
+    logger.info(f"Serving on http://{host}:{port} with {workers} workers, {threads} torch threads each")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Replace workers that die; exit once all have stopped after a signal
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            children.add(spawn_worker(app, sock, threads))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with pre-loaded models and multiple workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if hasattr(os, "fork"):
+        serve_forked(args.host, args.port, args.workers)
+    else:
+        logger.warning("fork() is not available: every worker loads its own copy of the models")
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Per-document BM25 index over the retrieval chunks.
+
+Dense retrieval misses exact identifiers (part numbers, clause IDs like
+"2.1", acronyms); BM25 matches them term by term, and askanything fuses
+both rankings with reciprocal-rank fusion. Postings are CSR arrays: the
+postings of term t are doc_ids[indptr[t]:indptr[t + 1]] with matching
+term_freqs, where a doc ID is a position in the session's chunk list. The
+index is built next to the FAISS index and persisted with it as one .npz.
+"""
+
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/_][a-z0-9]+)*")
+SEPARATOR_PATTERN = re.compile(r"[.\-/_]")
+
+def tokenize(text):
+    """Lowercased terms; compound identifiers ("2.1", "ab-12") are kept whole and also split"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(SEPARATOR_PATTERN.split(token))
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts"""
+
+    def __init__(self, vocabulary, indptr, doc_ids, term_freqs, doc_lengths):
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+
+        num_docs = len(doc_lengths)
+        doc_freqs = np.diff(indptr)
+        self.idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if num_docs else 1.0
+        self.length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / (average_length or 1.0))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query, k):
+        """Positions of the top-k texts for a query, best first (texts sharing no term are left out)"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            docs = self.doc_ids[self.indptr[t]:self.indptr[t + 1]]
+            freqs = self.term_freqs[self.indptr[t]:self.indptr[t + 1]]
+            scores[docs] += self.idf[t] * freqs * (BM25_K1 + 1) / (freqs + self.length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
+
+    def save(self, path):
+        """Write the index to `path` (.npz) through a temp file"""
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.array(self.vocabulary, dtype=str),
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs,
+                doc_lengths=self.doc_lengths
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays["vocabulary"].tolist(), arrays["indptr"], arrays["doc_ids"], arrays["term_freqs"], arrays["doc_lengths"])
+
+
+def build_bm25_index(texts):
+    """Tokenize texts and lay out their postings as CSR arrays"""
+    term_postings = {}
+    doc_lengths = np.zeros(len(texts), dtype=np.float32)
+    for position, text in enumerate(texts):
+        terms = tokenize(text)
+        doc_lengths[position] = len(terms)
+        for term, freq in Counter(terms).items():
+            term_postings.setdefault(term, []).append((position, freq))
+
+    vocabulary = sorted(term_postings)
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(term_postings[term]) for term in vocabulary])
+    doc_ids = np.empty(indptr[-1], dtype=np.int32)
+    term_freqs = np.empty(indptr[-1], dtype=np.float32)
+    for t, term in enumerate(vocabulary):
+        postings = term_postings[term]
+        doc_ids[indptr[t]:indptr[t + 1]] = [position for position, _ in postings]
+        term_freqs[indptr[t]:indptr[t + 1]] = [freq for _, freq in postings]
+    return BM25Index(vocabulary, indptr, doc_ids, term_freqs, doc_lengths)
@@ -1 +1,29 @@
-uploaded_file_path = None
\ No newline at end of file
+import logging
+from documents import DocumentRegistry, SessionRegistry
+from stores import CacheStore, SharedCache
+
+logger = logging.getLogger(__name__)
+
+# Cross-process store for state every worker must agree on
+try:
+    cache_store = CacheStore()
+except Exception as e:
+    logger.error(f"Failed to open shared cache store: {e}")
+    cache_store = None
+
+# Latest upload, shared by all worker processes
+shared_state = SharedCache("state", cache_store)
+
+def get_uploaded_file_path():
+    """Most recently uploaded document, used when a request does not name one"""
+    return shared_state.get("uploaded_file_path")
+
+def set_uploaded_file_path(file_path):
+    shared_state["uploaded_file_path"] = file_path
+
+# Content hashes of stored documents, keyed by (path, inode, mtime, size); per process
+document_registry = DocumentRegistry()
+
+# Per-document artifacts (chunks, index, challenge Q&A), bounded LRU; per process,
+# rebuilt on demand from the persisted indexes so any worker can serve any document
+sessions = SessionRegistry()
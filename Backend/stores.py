@@ -0,0 +1,519 @@
+"""
+Persistent, cross-process stores backed by SQLite.
+
+Every worker process opens the same database files under CACHE_DIR, so
+anything stored here survives restarts and is shared between uvicorn
+workers. Connections are opened per call (WAL mode), which keeps the
+stores safe to use from any thread or process.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from collections import OrderedDict
+import numpy as np
+
+from documents import CACHE_DIR
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_EXTRACTION_STORE_BYTES = 2 * 1024 ** 3  # compressed bytes kept on disk
+MAX_EMBEDDING_STORE_ENTRIES = 2000000
+EMBEDDING_EVICTION_INTERVAL = 10000  # inserts between entry-count checks
+ACCESS_FLUSH_SIZE = 1000  # read timestamps buffered in memory before they are written
+ACCESS_FLUSH_SECONDS = 60
+SQLITE_MAX_VARIABLES = 500  # keys per IN (...) query
+LOCAL_CACHE_ENTRIES = 1000  # per-process copy of an unbounded SharedCache
+
+
+class SQLiteStore:
+    """Base class: one SQLite database file with a schema created on first use"""
+
+    schema = ""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with closing(self.connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.schema)
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+
+class ExtractionStore(SQLiteStore):
+    """
+    Extracted document text keyed by content hash.
+
+    Text is stored zlib-compressed together with the character offset at
+    which each page starts, so a known document can be re-opened page by
+    page without running pdfminer again. When the total compressed size
+    exceeds `max_bytes`, the least recently read documents are evicted.
+
+    Reads never write: access times are buffered in memory like the
+    EmbeddingStore's and written with the next put (or once
+    ACCESS_FLUSH_SIZE / ACCESS_FLUSH_SECONDS is reached).
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS extractions (
+            document_id TEXT PRIMARY KEY,
+            text BLOB NOT NULL,
+            page_offsets TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions (last_access);
+    """
+
+    def __init__(self, db_path=os.path.join(CACHE_DIR, "extractions.sqlite3"), max_bytes=MAX_EXTRACTION_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.accessed = {}  # document_id -> last read time, not yet written
+        self.last_flush = time.time()
+        super().__init__(db_path)
+
+    def get(self, document_id):
+        """Return (text, page_offsets) for a document, or None on a miss"""
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT text, page_offsets FROM extractions WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        with self.lock:
+            self.accessed[document_id] = now
+            flush = len(self.accessed) >= ACCESS_FLUSH_SIZE or now - self.last_flush >= ACCESS_FLUSH_SECONDS
+        if flush:
+            with closing(self.connect()) as conn, conn:
+                self.flush_accesses(conn)
+        return zlib.decompress(row[0]).decode("utf-8"), json.loads(row[1])
+
+    def flush_accesses(self, conn):
+        """Write the buffered access times inside the caller's transaction"""
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+            self.last_flush = time.time()
+        if accessed:
+            conn.executemany(
+                "UPDATE extractions SET last_access = ? WHERE document_id = ?",
+                [(when, document_id) for document_id, when in accessed.items()]
+            )
+
+    def get_pages(self, document_id):
+        """Return the stored text split back into pages, or None on a miss"""
+        stored = self.get(document_id)
+        if stored is None:
+            return None
+        text, page_offsets = stored
+        bounds = page_offsets + [len(text)]
+        return [text[bounds[i]:bounds[i + 1]] for i in range(len(page_offsets))]
+
+    def put(self, document_id, pages):
+        """Store a document's pages and evict old entries past the size budget"""
+        page_offsets = []
+        offset = 0
+        for page in pages:
+            page_offsets.append(offset)
+            offset += len(page)
+        blob = zlib.compress("".join(pages).encode("utf-8"))
+
+        with closing(self.connect()) as conn, conn:
+            self.flush_accesses(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                (document_id, blob, json.dumps(page_offsets), len(blob), time.time())
+            )
+            self.evict(conn)
+
+    def evict(self, conn):
+        """Delete least recently used documents until under the size budget"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for document_id, size in conn.execute("SELECT document_id, size FROM extractions ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM extractions WHERE document_id = ?", (document_id,))
+            total -= size
+            logger.info(f"Evicted extracted text for {document_id}")
+            if total <= self.max_bytes:
+                break
+
+
+class EmbeddingStore(SQLiteStore):
+    """
+    Content-addressed embedding cache: hash(model ID + normalized text) -> float32 vector.
+
+    Shared by every document and question, so re-ingesting a revised
+    document only encodes paragraphs that actually changed. Least recently
+    used vectors are evicted once the store exceeds `max_entries`.
+
+    Reads never write: access times are buffered in memory and written
+    with the next insert (or once ACCESS_FLUSH_SIZE / ACCESS_FLUSH_SECONDS
+    is reached), and the entry count is only checked every
+    EMBEDDING_EVICTION_INTERVAL inserts.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            vector BLOB NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access);
+    """
+
+    def __init__(self, db_path=os.path.join(CACHE_DIR, "embeddings.sqlite3"), max_entries=MAX_EMBEDDING_STORE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.accessed = {}  # key -> last read time, not yet written
+        self.last_flush = time.time()
+        self.inserts_since_check = EMBEDDING_EVICTION_INTERVAL  # check once on the first insert
+        super().__init__(db_path)
+
+    def get_many(self, keys):
+        """Return {key: float32 vector} for the keys that are cached"""
+        found = {}
+        with closing(self.connect()) as conn:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+        now = time.time()
+        with self.lock:
+            self.accessed.update(dict.fromkeys(found, now))
+            flush = len(self.accessed) >= ACCESS_FLUSH_SIZE or now - self.last_flush >= ACCESS_FLUSH_SECONDS
+        if flush:
+            with closing(self.connect()) as conn, conn:
+                self.flush_accesses(conn)
+        return found
+
+    def flush_accesses(self, conn):
+        """Write the buffered access times inside the caller's transaction"""
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+            self.last_flush = time.time()
+        if accessed:
+            conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(when, key) for key, when in accessed.items()])
+
+    def put_many(self, items):
+        """Store (key, vector) pairs; every EMBEDDING_EVICTION_INTERVAL inserts, evict the least recently used past the budget"""
+        now = time.time()
+        with self.lock:
+            self.inserts_since_check += len(items)
+            check = self.inserts_since_check >= EMBEDDING_EVICTION_INTERVAL
+            if check:
+                self.inserts_since_check = 0
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            )
+            self.flush_accesses(conn)
+            if not check:
+                return
+            excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (excess,)
+                )
+                logger.info(f"Evicted {excess} cached embeddings")
+
+
+class CacheStore(SQLiteStore):
+    """
+    JSON values grouped by namespace (answer caches, shared state).
+
+    Lets every worker process see the summaries, answers, challenge
+    questions and latest-upload state produced by any other worker.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS cache_last_access ON cache (namespace, last_access);
+    """
+
+    def __init__(self, db_path=os.path.join(CACHE_DIR, "cache.sqlite3")):
+        self.lock = threading.Lock()
+        self.accessed = {}  # (namespace, key) -> last read time, written with the next put
+        super().__init__(db_path)
+
+    def get(self, namespace, key):
+        """Return the stored value, or None on a miss (a plain read: no write transaction)"""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        if row is None:
+            return None
+        self.touch(namespace, key)
+        return json.loads(row[0])
+
+    def touch(self, namespace, key):
+        """Record a read in memory; it reaches the LRU order with the next put"""
+        with self.lock:
+            self.accessed[(namespace, key)] = time.time()
+
+    def flush_accesses(self, conn):
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+        if accessed:
+            conn.executemany(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                [(when, namespace, key) for (namespace, key), when in accessed.items()]
+            )
+
+    def put(self, namespace, key, value, max_entries=None):
+        """Store a value; past `max_entries` the namespace's least recently used keys are evicted"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (namespace, key, json.dumps(value), time.time()))
+            self.flush_accesses(conn)
+            if max_entries is None:
+                return
+            excess = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0] - max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+                    (namespace, namespace, excess)
+                )
+
+    def items(self, namespace, prefix=""):
+        """All (key, value) pairs of a namespace whose key starts with `prefix`"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM cache WHERE namespace = ? AND substr(key, 1, ?) = ?",
+                (namespace, len(prefix), prefix)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def count(self, namespace):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+class CorpusStore(SQLiteStore):
+    """
+    Documents and chunk provenance of the cross-document corpus index.
+
+    Every document gets a sequence number (`seq`) and is assigned to one
+    corpus shard. Its chunk rows (section, paragraph number, text) are kept
+    here so a search hit is resolved with one indexed lookup. `add_document`
+    holds an IMMEDIATE transaction while the caller writes the shard file,
+    which serializes corpus updates across worker processes.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS documents (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id TEXT UNIQUE NOT NULL,
+            shard INTEGER NOT NULL,
+            filename TEXT,
+            metadata TEXT NOT NULL,
+            num_chunks INTEGER NOT NULL,
+            active INTEGER NOT NULL,
+            added_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS chunks (
+            seq INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            section TEXT,
+            paragraph_number INTEGER,
+            text TEXT NOT NULL,
+            PRIMARY KEY (seq, position)
+        ) WITHOUT ROWID;
+    """
+
+    def add_document(self, document_id, shard, filename, metadata, chunks, write_vectors):
+        """
+        Register a document and its chunks, calling write_vectors(seq) inside
+        the transaction. A document already in the corpus is reactivated
+        with the new filename and metadata instead. Returns its seq.
+        """
+        with closing(self.connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT seq FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE documents SET filename = ?, metadata = ?, active = 1 WHERE seq = ?",
+                        (filename, json.dumps(metadata), row[0])
+                    )
+                    conn.commit()
+                    return row[0]
+
+                seq = conn.execute(
+                    "INSERT INTO documents (document_id, shard, filename, metadata, num_chunks, active, added_at) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                    (document_id, shard, filename, json.dumps(metadata), len(chunks), time.time())
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+                    [(seq, position, chunk["section"], chunk["paragraph_number"], chunk["text"]) for position, chunk in enumerate(chunks)]
+                )
+                write_vectors(seq)
+                conn.commit()
+                return seq
+            except Exception:
+                conn.rollback()
+                raise
+
+    def get_metadata(self, document_id):
+        """A document's upload metadata, or None if it is not in the corpus"""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT metadata FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def deactivate(self, document_id):
+        """Leave a document out of corpus search (e.g. superseded by a new revision)"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("UPDATE documents SET active = 0 WHERE document_id = ?", (document_id,))
+
+    def select_documents(self, document_ids=None, filename=None, metadata=None, uploaded_after=None, uploaded_before=None):
+        """(seq, shard, num_chunks) of the active documents matching every given filter"""
+        if document_ids is not None and not document_ids:
+            return []
+        conditions = ["active = 1"]
+        params = []
+        if document_ids is not None:
+            conditions.append(f"document_id IN ({', '.join(['?'] * len(document_ids))})")
+            params.extend(document_ids)
+        if filename is not None:
+            conditions.append("instr(lower(filename), lower(?)) > 0")
+            params.append(filename)
+        for key, value in (metadata or {}).items():
+            conditions.append("json_extract(metadata, ?) = ?")
+            params.extend([f'$."{key}"', value])
+        if uploaded_after is not None:
+            conditions.append("added_at >= ?")
+            params.append(uploaded_after)
+        if uploaded_before is not None:
+            conditions.append("added_at <= ?")
+            params.append(uploaded_before)
+        with closing(self.connect()) as conn:
+            return conn.execute(f"SELECT seq, shard, num_chunks FROM documents WHERE {' AND '.join(conditions)}", params).fetchall()
+
+    def get_chunks(self, keys):
+        """Chunk and document fields for (seq, position) pairs of active documents"""
+        found = {}
+        with closing(self.connect()) as conn:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES // 2):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES // 2]
+                # Driven from the key list, so each hit is one primary-key lookup
+                rows = conn.execute(
+                    f"WITH keys (seq, position) AS (VALUES {', '.join(['(?, ?)'] * len(batch))}) "
+                    "SELECT c.seq, c.position, d.document_id, d.filename, d.metadata, c.section, c.paragraph_number, c.text "
+                    "FROM keys k CROSS JOIN chunks c ON c.seq = k.seq AND c.position = k.position "
+                    "JOIN documents d ON d.seq = c.seq WHERE d.active = 1",
+                    [value for key in batch for value in key]
+                ).fetchall()
+                for seq, position, document_id, filename, metadata, section, paragraph_number, text in rows:
+                    found[(seq, position)] = {
+                        "document_id": document_id,
+                        "filename": filename,
+                        "metadata": json.loads(metadata),
+                        "section": section,
+                        "paragraph_number": paragraph_number,
+                        "text": text
+                    }
+        return found
+
+    def count(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*), COALESCE(SUM(num_chunks), 0) FROM documents WHERE active = 1").fetchone()
+
+
+class SharedCache:
+    """
+    Dict-like view of one CacheStore namespace, bounded to `max_entries` (LRU).
+
+    Falls back to an in-process dict when no store is available, so callers
+    work the same with a single worker. Values round-trip through JSON:
+    tuples come back as lists.
+
+    With `read_through`, values read from or written to the store are also
+    kept in a per-process LRU copy, so repeated hits never touch SQLite
+    (`get_local` serves them without blocking). Only use it for namespaces
+    whose values never change once written, since other processes' updates
+    are not seen by the copy.
+    """
+
+    def __init__(self, namespace, store, max_entries=None, read_through=False):
+        self.namespace = namespace
+        self.store = store
+        self.max_entries = max_entries
+        self.read_through = read_through or store is None
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_local(self, key, default=None):
+        """This process's copy of a value, or `default`; never blocks on the store"""
+        if not self.read_through:
+            return default
+        with self.lock:
+            value = self.local.get(key)
+            if value is None:
+                return default
+            self.local.move_to_end(key)
+        if self.store is not None:
+            self.store.touch(self.namespace, key)
+        return value
+
+    def keep_local(self, key, value):
+        with self.lock:
+            self.local[key] = value
+            self.local.move_to_end(key)
+            while len(self.local) > (self.max_entries or LOCAL_CACHE_ENTRIES):
+                self.local.popitem(last=False)
+
+    def get(self, key, default=None):
+        value = self.get_local(key)
+        if value is not None or self.store is None:
+            return default if value is None else value
+        value = self.store.get(self.namespace, key)
+        if value is None:
+            return default
+        if self.read_through:
+            self.keep_local(key, value)
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, value):
+        if self.store is not None:
+            self.store.put(self.namespace, key, value, self.max_entries)
+        if self.read_through:
+            # Keep what a reader would get back from the store (tuples become lists)
+            self.keep_local(key, value if self.store is None else json.loads(json.dumps(value)))
+
+    def items(self, prefix=""):
+        if self.store is None:
+            with self.lock:
+                return [(key, value) for key, value in self.local.items() if key.startswith(prefix)]
+        return self.store.items(self.namespace, prefix)
+
+    def __len__(self):
+        return len(self.local) if self.store is None else self.store.count(self.namespace)
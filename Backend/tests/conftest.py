@@ -0,0 +1,78 @@
+"""
+Shared fixtures: a throwaway upload/cache directory and a fake encoder.
+
+The environment is set before any backend module is imported, because
+documents.py reads UPLOAD_DIR and CACHE_DIR at import time. The fake
+encoder hashes words into a bag-of-words vector, so tests run without
+downloading a model and texts sharing words are close in the index.
+"""
+
+import os
+import re
+import sys
+import hashlib
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="genai-tests-")
+os.environ["UPLOAD_DIR"] = os.path.join(TEST_DIR, "uploads")
+os.environ["CACHE_DIR"] = os.path.join(TEST_DIR, "cache")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+sys.path.insert(0, BACKEND_DIR)
+
+import models
+import embedding_service
+from documents import DocumentSession
+
+FAKE_DIMENSION = 64
+
+
+class FakeTokenizer:
+    """Whitespace tokenizer with the call signatures the chunker and encoder use"""
+
+    def __call__(self, text, truncation=False, max_length=None, add_special_tokens=True, return_offsets_mapping=False):
+        if isinstance(text, str):
+            spans = [match.span() for match in re.finditer(r"\S+", text)]
+            return {"input_ids": list(range(len(spans))), "offset_mapping": spans}
+        lengths = [len(t.split()) if max_length is None else min(len(t.split()), max_length) for t in text]
+        return {"input_ids": [list(range(length)) for length in lengths]}
+
+
+class FakeEncoder:
+    """Deterministic bag-of-words embeddings standing in for the SentenceTransformer"""
+
+    max_seq_length = 256
+    tokenizer = FakeTokenizer()
+
+    def get_sentence_embedding_dimension(self):
+        return FAKE_DIMENSION
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        vectors = np.zeros((len(texts), FAKE_DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % FAKE_DIMENSION] += 1.0
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setattr(embedding_service.encoder_handle, "model", FakeEncoder())
+    monkeypatch.setattr(embedding_service.encoder_handle, "state", models.READY)
+
+
+@pytest.fixture
+def make_session(tmp_path):
+    """Create a DocumentSession over a text file; the document ID defaults to the text's hash"""
+    def make(paragraphs, document_id=None):
+        text = "\n\n".join(paragraphs)
+        document_id = document_id or hashlib.md5(text.encode("utf-8")).hexdigest()
+        file_path = tmp_path / f"{document_id}.txt"
+        file_path.write_text(text, encoding="utf-8")
+        return DocumentSession(document_id, str(file_path))
+    return make
@@ -0,0 +1,69 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import state
+from challenge import generate_simple_questions, MAX_CHALLENGE_QUESTIONS
+from documents import DocumentSession
+
+
+def fake_generate(session, num_questions):
+    session.challenge_qas[num_questions] = [(f"question {i} of {num_questions}", f"answer {i}") for i in range(num_questions)]
+    return [{"question": question} for question, _ in session.challenge_qas[num_questions]]
+
+
+def fake_evaluate(user_answers, session, num_questions):
+    return [{"question": question, "user_answer": user_answer} for user_answer, (question, _) in zip(user_answers, session.challenge_qas[num_questions])]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "generate_questions_and_answers", fake_generate)
+    monkeypatch.setattr(main, "evaluate_user_answers", fake_evaluate)
+    return TestClient(main.app)
+
+
+def upload(client, text):
+    return client.post("/upload/", files={"file": ("challenge.txt", text.encode("utf-8"))}).json()["document_id"]
+
+
+def test_challenges_of_different_sizes_coexist(client):
+    document_id = upload(client, "a document with two challenges of different sizes.")
+    three = client.get("/challenge/", params={"document_id": document_id, "num_questions": 3}).json()
+    five = client.get("/challenge/", params={"document_id": document_id, "num_questions": 5}).json()
+    assert (three["num_questions"], len(three["questions"])) == (3, 3)
+    assert (five["num_questions"], len(five["questions"])) == (5, 5)
+
+    results = client.post("/challenge/", json={"user_answers": ["x"] * 3, "document_id": document_id, "num_questions": 3}).json()["results"]
+    assert [result["question"] for result in results] == [f"question {i} of 3" for i in range(3)]
+    results = client.post("/challenge/", json={"user_answers": ["x"] * 5, "document_id": document_id, "num_questions": 5}).json()["results"]
+    assert [result["question"] for result in results] == [f"question {i} of 5" for i in range(5)]
+
+
+def test_expected_answers_are_restored_from_the_cache(client, monkeypatch):
+    document_id = upload(client, "a document whose session is evicted between the two requests.")
+    client.get("/challenge/", params={"document_id": document_id, "num_questions": 4})
+
+    # Another worker, or an evicted session: nothing generated in this session yet
+    fresh = DocumentSession(document_id, state.sessions.get(document_id).file_path)
+    monkeypatch.setattr(state.sessions, "get_open", lambda document_id: None)
+    monkeypatch.setattr(state.sessions, "get", lambda document_id: fresh)
+
+    results = client.post("/challenge/", json={"user_answers": ["x"] * 4, "document_id": document_id, "num_questions": 4}).json()["results"]
+    assert [result["question"] for result in results] == [f"question {i} of 4" for i in range(4)]
+    assert list(fresh.challenge_qas) == [4]
+
+
+@pytest.mark.parametrize("num_questions", [0, MAX_CHALLENGE_QUESTIONS + 1])
+def test_challenge_size_is_validated(client, num_questions):
+    assert client.get("/challenge/", params={"num_questions": num_questions}).status_code == 422
+    assert client.post("/challenge/", json={"user_answers": [], "num_questions": num_questions}).status_code == 422
+
+
+def test_simple_questions_follow_the_requested_size(tmp_path):
+    session = DocumentSession("simple", str(tmp_path / "simple.txt"))
+    phrases = [f"phrase {i}" for i in range(8)]
+    assert len(generate_simple_questions("", phrases, session, num_questions=6)) == 6
+    assert len(generate_simple_questions("", phrases, session, num_questions=2)) == 2
+    assert [answer for _, answer in session.challenge_qas[6]] == phrases[:6]
+    assert len(session.challenge_qas[2]) == 2
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import corpus
+from corpus import Corpus
+from embedding_service import encode
+
+CONTRACT = ["the supplier delivers goods every monday.", "invoices are payable within thirty days."]
+HANDBOOK = ["employees accrue vacation days every month.", "the office closes on public holidays."]
+
+
+@pytest.fixture
+def documents(tmp_path):
+    documents = Corpus(str(tmp_path / "corpus"), num_shards=2)
+    yield documents
+    documents.executor.shutdown()
+
+
+def search(documents, query, k=10, filters=None):
+    return documents.search(encode([query])[0], k, filters)
+
+
+def test_search_spans_documents_with_provenance(documents, make_session):
+    contract, handbook = make_session(CONTRACT), make_session(HANDBOOK)
+    assert documents.add_document(contract, "contract.txt", {"team": "legal"})
+    assert documents.add_document(handbook, "handbook.txt", {"team": "hr"})
+
+    results = search(documents, "when are invoices payable?")
+    assert len(results) == 4
+    assert results[0]["text"] == CONTRACT[1]
+    assert (results[0]["document_id"], results[0]["filename"], results[0]["metadata"]) == (contract.document_id, "contract.txt", {"team": "legal"})
+    assert [result["distance"] for result in results] == sorted(result["distance"] for result in results)
+    assert documents.get_stats() == {"documents": 2, "chunks": 4, "shards": 2}
+
+
+def test_filters(documents, make_session):
+    contract, handbook = make_session(CONTRACT), make_session(HANDBOOK)
+    documents.add_document(contract, "contract.txt", {"team": "legal"})
+    documents.add_document(handbook, "handbook.txt", {"team": "hr"})
+
+    assert {result["document_id"] for result in search(documents, "days", filters={"metadata": {"team": "hr"}})} == {handbook.document_id}
+    assert {result["document_id"] for result in search(documents, "days", filters={"filename": "CONTRACT"})} == {contract.document_id}
+    assert {result["document_id"] for result in search(documents, "days", filters={"document_ids": [contract.document_id]})} == {contract.document_id}
+    assert search(documents, "days", filters={"document_ids": []}) == []
+    assert search(documents, "days", filters={"metadata": {"team": "sales"}}) == []
+
+
+def test_revision_replaces_its_predecessor_and_inherits_metadata(documents, make_session):
+    original = make_session(CONTRACT)
+    documents.add_document(original, "contract.txt", {"team": "legal"})
+    revision = make_session(CONTRACT + ["late payments accrue interest monthly."])
+    documents.add_document(revision, "contract-v2.txt", None, replaces=original.document_id)
+    documents.remove_document(original.document_id)
+
+    results = search(documents, "payments", filters={"metadata": {"team": "legal"}})
+    assert {result["document_id"] for result in results} == {revision.document_id}
+    assert len(results) == 3
+
+    # Re-adding without metadata keeps the document's own
+    documents.add_document(revision, "contract-v2.txt")
+    assert search(documents, "payments", k=1)[0]["metadata"] == {"team": "legal"}
+
+
+def test_delta_merges_into_the_base_index(documents, make_session, monkeypatch):
+    monkeypatch.setattr(corpus, "SHARD_DELTA_MAX_VECTORS", 3)
+    sessions = [make_session([f"document {i} mentions topic {i} in its first paragraph.", f"document {i} closes with remark {i}."]) for i in range(6)]
+    for i, session in enumerate(sessions):
+        documents.add_document(session, f"doc-{i}.txt", {"i": str(i)})
+
+    merged = [shard for shard in documents.shards if os.path.exists(shard.base.path)]
+    assert merged
+    assert sum(shard.base.get_index().ntotal for shard in merged) >= 4
+    results = search(documents, "document closes with remark", k=12)
+    assert len(results) == 12
+    assert len({(result["document_id"], result["text"]) for result in results}) == 12
@@ -0,0 +1,63 @@
+import sqlite3
+import itertools
+
+import numpy as np
+import pytest
+
+import stores
+import embedding_service
+from embedding_service import encode, encode_uncached
+from stores import EmbeddingStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(stores.time, "time", lambda: float(next(clock)))
+    monkeypatch.setattr(stores, "EMBEDDING_EVICTION_INTERVAL", 1)
+    return EmbeddingStore(str(tmp_path / "embeddings.sqlite3"), max_entries=3)
+
+
+def vector(value):
+    return np.full(4, value, dtype=np.float32)
+
+
+def test_reads_are_read_only_and_eviction_keeps_recently_read_vectors(store):
+    for key, value in [("a", 1), ("b", 2), ("c", 3)]:
+        store.put_many([(key, vector(value))])
+    with sqlite3.connect(store.db_path) as conn:
+        before = conn.execute("SELECT key, last_access FROM embeddings ORDER BY key").fetchall()
+
+    found = store.get_many(["a", "missing"])
+    assert list(found) == ["a"]
+    np.testing.assert_array_equal(found["a"], vector(1))
+    with sqlite3.connect(store.db_path) as conn:
+        assert conn.execute("SELECT key, last_access FROM embeddings ORDER BY key").fetchall() == before
+
+    store.put_many([("d", vector(4))])
+    assert sorted(store.get_many(["a", "b", "c", "d"])) == ["a", "c", "d"]
+
+
+def test_encode_reuses_cached_vectors_across_calls(monkeypatch):
+    texts = ["first cached paragraph", "second cached paragraph", "first cached paragraph"]
+    encoded = []
+    monkeypatch.setattr(embedding_service, "encode_uncached", lambda texts, *args: encoded.extend(texts) or encode_uncached(texts, *args))
+
+    first = encode(texts)
+    assert encoded == texts[:2]  # each distinct text is encoded once
+    hits = embedding_service.get_cache_stats()["hits"]
+    second = encode(list(reversed(texts)))
+    assert encoded == texts[:2]
+    assert embedding_service.get_cache_stats()["hits"] == hits + 3
+
+    np.testing.assert_array_equal(first, second[::-1])
+    np.testing.assert_array_equal(first, encode(texts, use_cache=False))
+
+
+def test_normalize_and_dtype_apply_to_cached_vectors():
+    texts = ["a normalized vector", "another normalized vector"]
+    encode(texts)
+    normalized = encode(texts, dtype=np.float16, normalize=True)
+    assert normalized.dtype == np.float16
+    np.testing.assert_allclose(np.linalg.norm(normalized.astype(np.float32), axis=1), 1.0, rtol=1e-3)
+    assert encode([]).shape == (0, encode(texts).shape[1])
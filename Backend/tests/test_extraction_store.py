@@ -0,0 +1,52 @@
+import sqlite3
+import itertools
+
+import pytest
+
+import stores
+from stores import ExtractionStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(stores.time, "time", lambda: float(next(clock)))
+    return ExtractionStore(str(tmp_path / "extractions.sqlite3"))
+
+
+def last_access(store):
+    with sqlite3.connect(store.db_path) as conn:
+        return dict(conn.execute("SELECT document_id, last_access FROM extractions").fetchall())
+
+
+def sizes(store):
+    with sqlite3.connect(store.db_path) as conn:
+        return dict(conn.execute("SELECT document_id, size FROM extractions").fetchall())
+
+
+def test_pages_round_trip(store):
+    store.put("doc", ["first page. ", "", "third page."])
+    assert store.get_pages("doc") == ["first page. ", "", "third page."]
+    assert store.get("doc") == ("first page. third page.", [0, 12, 12])
+    assert store.get_pages("missing") is None
+
+
+def test_reads_are_buffered_until_the_next_put(store):
+    store.put("a", ["a"])
+    store.put("b", ["b"])
+    before = last_access(store)
+    store.get("a")
+    assert last_access(store) == before
+
+    store.put("c", ["c"])
+    after = last_access(store)
+    assert after["a"] > after["b"]
+
+
+def test_eviction_drops_the_least_recently_read_document(store):
+    store.put("a", ["a" * 1000])
+    store.put("b", ["b" * 1000])
+    store.get("a")
+    store.max_bytes = sum(sizes(store).values()) + 1
+    store.put("c", ["c" * 1000])
+    assert sorted(sizes(store)) == ["a", "c"]
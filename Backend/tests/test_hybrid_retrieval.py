@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import models
+import askanything
+import embedding_service
+from askanything import fuse_rankings, search_questions, initialize_document_index, NO_MATCH, QA_UNAVAILABLE
+from sparse_index import BM25Index, build_bm25_index, tokenize
+
+TEXTS = [
+    "the supplier delivers the goods to the warehouse every monday morning.",
+    "clause 2.1 limits the supplier liability to the contract value.",
+    "part number ab-12 replaces the discontinued part in every order.",
+    "the warehouse stores goods for the supplier and the customer alike.",
+]
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("See Clause 2.1 and AB-12.") == ["see", "clause", "2.1", "2", "1", "and", "ab-12", "ab", "12"]
+
+
+def test_bm25_ranks_exact_identifiers_first():
+    index = build_bm25_index(TEXTS)
+    assert index.search("2.1", 3)[0] == 1
+    assert index.search("AB-12", 3)[0] == 2
+    assert sorted(index.search("supplier warehouse goods", 2)) == [0, 3]
+    assert index.search("zzzqqq", 3) == []
+
+
+def test_bm25_index_round_trips_through_disk(tmp_path):
+    index = build_bm25_index(TEXTS)
+    path = str(tmp_path / "sparse.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    for query in ("2.1", "supplier", "warehouse goods"):
+        assert loaded.search(query, 4) == index.search(query, 4)
+
+
+def test_fusion_prefers_items_ranked_by_both_retrievers():
+    assert fuse_rankings([[1, 2, 3], [4, 3, 5]], 3) == [3, 1, 4]
+    assert fuse_rankings([[1, 2], []], 5) == [1, 2]
+    assert fuse_rankings([[], []], 3) == []
+
+
+def test_retrieval_modes(make_session):
+    session = make_session(TEXTS)
+    assert initialize_document_index(session)
+    questions = ["which part is ab-12?", "what does clause 2.1 say?"]
+    q_embeddings = askanything.encode(questions)
+
+    sparse = search_questions(questions, None, session, k=1, mode="sparse")
+    assert [chunks[0]["text"] for chunks in sparse] == [TEXTS[2], TEXTS[1]]
+    hybrid = search_questions(questions, q_embeddings, session, k=2, mode="hybrid")
+    assert all(len(chunks) == 2 for chunks in hybrid)
+    assert TEXTS[2] in [chunk["text"] for chunk in hybrid[0]]
+    assert search_questions(["zzzqqq"], None, session, k=3, mode="sparse") == [[]]
+    with pytest.raises(ValueError):
+        search_questions(questions, q_embeddings, session, mode="fuzzy")
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def ask(client, document_id, question, mode):
+    return client.post("/askanything/", json={"question": question, "document_id": document_id, "mode": mode}).json()
+
+
+def cached_answer(document_id, question, mode):
+    return main.qa_cache.get(main.get_qa_cache_key(document_id, question, mode))
+
+
+@pytest.fixture
+def no_qa_model(monkeypatch):
+    """A QA model that failed to load (and is never downloaded by the tests)"""
+    monkeypatch.setattr(askanything.qa_handle, "model", None)
+    monkeypatch.setattr(askanything.qa_handle, "state", models.FAILED)
+
+
+def test_empty_sparse_retrieval_is_a_distinct_uncached_answer(client, no_qa_model):
+    document_id = client.post("/upload/", files={"file": ("nomatch.txt", "\n\n".join(TEXTS).encode("utf-8"))}).json()["document_id"]
+    result = ask(client, document_id, "zzzqqq", "sparse")
+    assert (result["answer"], result["justification"]) == NO_MATCH
+    assert cached_answer(document_id, "zzzqqq", "sparse") is None
+
+
+@pytest.mark.parametrize("failed", ["qa", "encoder"])
+def test_unavailable_models_are_not_cached(client, monkeypatch, no_qa_model, failed):
+    if failed == "encoder":
+        # Without an encoder nothing is indexed or retrieved, which must not read as "no match"
+        monkeypatch.setattr(embedding_service.encoder_handle, "model", None)
+        monkeypatch.setattr(embedding_service.encoder_handle, "state", models.FAILED)
+    document_id = client.post("/upload/", files={"file": (f"{failed}.txt", f"{failed} unavailable. ".encode("utf-8") + TEXTS[0].encode("utf-8"))}).json()["document_id"]
+
+    result = ask(client, document_id, "when are goods delivered?", "dense")
+    assert (result["answer"], result["justification"]) == QA_UNAVAILABLE
+    assert cached_answer(document_id, "when are goods delivered?", "dense") is None
+
+
+def test_answers_are_cached(client, monkeypatch):
+    class FakeBatcher:
+        async def run(self, item):
+            question, top_chunks = item
+            return "on monday", top_chunks[0]["text"]
+
+    monkeypatch.setattr(main, "qa_batcher", FakeBatcher())
+    document_id = client.post("/upload/", files={"file": ("answered.txt", "\n\n".join(TEXTS[:2]).encode("utf-8"))}).json()["document_id"]
+    result = ask(client, document_id, "when are goods delivered?", "hybrid")
+    assert result["answer"] == "on monday"
+    assert cached_answer(document_id, "when are goods delivered?", "hybrid") == result
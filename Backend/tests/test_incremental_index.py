@@ -0,0 +1,66 @@
+import numpy as np
+
+import askanything
+from askanything import get_chunk_ids, initialize_document_index, update_document_index, retrieve_chunks
+from documents import DocumentSession
+
+INTRODUCTION = "the warranty covers defects in materials and workmanship for two years after purchase."
+PAYMENT = "invoices are payable within thirty days and late payments accrue interest monthly."
+TERMINATION = "either party may terminate the agreement with ninety days written notice to the other."
+LIABILITY = "liability for indirect damages is excluded except in cases of gross negligence or fraud."
+
+
+def chunk(text, section=None, paragraph_number=1):
+    return {"section": section, "paragraph_number": paragraph_number, "text": text}
+
+
+def test_chunk_ids_depend_only_on_text():
+    first = get_chunk_ids([chunk(INTRODUCTION, "1. Scope", 1), chunk(PAYMENT, "2. Fees", 1)])
+    moved = get_chunk_ids([chunk(PAYMENT, "3. Fees", 4), chunk(INTRODUCTION, "2. Scope", 7)])
+    assert first.dtype == np.int64
+    assert list(first) == list(moved[::-1])
+    assert (first >= 0).all()
+
+
+def test_repeated_texts_get_distinct_stable_ids():
+    ids = get_chunk_ids([chunk(PAYMENT), chunk(PAYMENT), chunk(INTRODUCTION)])
+    assert len(set(ids.tolist())) == 3
+    assert list(ids) == list(get_chunk_ids([chunk(PAYMENT), chunk(PAYMENT), chunk(INTRODUCTION)]))
+
+
+def test_revision_reuses_unchanged_vectors_and_removes_deleted_chunks(make_session, monkeypatch):
+    previous = make_session([INTRODUCTION, PAYMENT, TERMINATION])
+    assert initialize_document_index(previous)
+    session = make_session([INTRODUCTION, TERMINATION, LIABILITY])
+
+    encoded = []
+    original_encode = askanything.encode
+    monkeypatch.setattr(askanything, "encode", lambda texts, *args, **kwargs: encoded.extend(texts) or original_encode(texts, *args, **kwargs))
+
+    assert update_document_index(session, previous) == (1, 1)
+    assert encoded == [LIABILITY]
+
+    expected_ids = get_chunk_ids(session.structured_chunks)
+    index_ids = askanything.faiss.vector_to_array(session.index.id_map)
+    assert sorted(index_ids.tolist()) == sorted(expected_ids.tolist())
+    assert session.index.ntotal == 3
+    assert previous.index.ntotal == 3  # the previous revision's index is left untouched
+
+    kept = previous.chunk_positions[int(expected_ids[0])]
+    np.testing.assert_array_equal(session.embeddings[0], previous.embeddings[kept])
+    assert retrieve_chunks(LIABILITY, session, k=1, mode="dense")[0]["text"] == LIABILITY
+
+
+def test_revision_of_a_document_loaded_from_disk(make_session):
+    built = make_session([INTRODUCTION, PAYMENT, TERMINATION])
+    assert initialize_document_index(built)
+
+    # A fresh session maps the persisted index read-only
+    previous = DocumentSession(built.document_id, built.file_path)
+    assert initialize_document_index(previous)
+    session = make_session([INTRODUCTION, LIABILITY])
+
+    assert update_document_index(session, previous) == (1, 2)
+    assert session.index.ntotal == 2
+    assert previous.index.ntotal == 3
+    assert retrieve_chunks(PAYMENT, previous, k=1, mode="dense")[0]["text"] == PAYMENT
@@ -0,0 +1,103 @@
+import sqlite3
+import itertools
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import stores
+import upload
+from stores import CacheStore, SharedCache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Strictly increasing clock, so LRU order never depends on timer resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr(stores.time, "time", lambda: float(next(clock)))
+    return CacheStore(str(tmp_path / "cache.sqlite3"))
+
+
+def stored_keys(store, namespace):
+    return sorted(key for key, _ in store.items(namespace))
+
+
+def test_eviction_drops_the_least_recently_read_key(store):
+    cache = SharedCache("answers", store, max_entries=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1  # buffered read, written with the next put
+    cache["c"] = 3
+    assert stored_keys(store, "answers") == ["a", "c"]
+    assert len(cache) == 2
+
+
+def test_reads_do_not_write(store):
+    cache = SharedCache("answers", store)
+    cache["a"] = 1
+    with sqlite3.connect(store.db_path) as conn:
+        before = conn.execute("SELECT last_access FROM cache").fetchall()
+    assert cache.get("a") == 1
+    with sqlite3.connect(store.db_path) as conn:
+        assert conn.execute("SELECT last_access FROM cache").fetchall() == before
+
+
+def test_read_through_copy_serves_hits_without_the_store(store):
+    writer = SharedCache("answers", store, read_through=True)
+    reader = SharedCache("answers", store, read_through=True)  # another worker process
+    writer["a"] = ("answer", "justification")
+
+    # Local copies hold what the store would return: JSON turns tuples into lists
+    assert writer.get_local("a") == ["answer", "justification"]
+    assert reader.get_local("a") is None
+    assert reader.get("a") == ["answer", "justification"]
+
+    with sqlite3.connect(store.db_path) as conn:
+        conn.execute("DELETE FROM cache")
+    assert reader.get_local("a") == ["answer", "justification"]
+    assert reader.get("a") == ["answer", "justification"]
+
+
+def test_plain_cache_has_no_local_copy(store):
+    cache = SharedCache("state", store)
+    cache["latest"] = "path"
+    assert cache.get_local("latest") is None
+    assert cache.get("latest") == "path"
+
+
+def test_local_copy_is_bounded(store):
+    cache = SharedCache("answers", store, max_entries=2, read_through=True)
+    for key in "abc":
+        cache[key] = key
+    assert cache.get_local("a") is None
+    assert [cache.get_local(key) for key in "bc"] == ["b", "c"]
+
+
+def test_without_a_store_the_cache_is_in_process():
+    cache = SharedCache("answers", None, max_entries=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+    cache["c"] = 3
+    assert "b" not in cache
+    assert cache.items() == [("a", 1), ("c", 3)]
+
+
+@pytest.mark.parametrize("summary", [upload.SUMMARY_UNAVAILABLE, "File not found.", "Error generating summary: out of memory"])
+def test_failed_summaries_are_not_cached(monkeypatch, summary):
+    monkeypatch.setattr(main, "generate_summary", lambda session: summary)
+    client = TestClient(main.app)
+    document_id = client.post("/upload/", files={"file": ("failed.txt", summary.encode("utf-8") + b" summary test document.")}).json()["document_id"]
+
+    assert client.get("/upload/", params={"document_id": document_id}).json() == {"summary": summary}
+    assert main.summary_cache.get(document_id) is None
+
+
+def test_summaries_are_cached(monkeypatch):
+    monkeypatch.setattr(main, "generate_summary", lambda session: "A short summary.")
+    client = TestClient(main.app)
+    document_id = client.post("/upload/", files={"file": ("cached.txt", b"a document whose summary is cached after the first request.")}).json()["document_id"]
+
+    client.get("/upload/", params={"document_id": document_id})
+    monkeypatch.setattr(main, "generate_summary", lambda session: pytest.fail("summary regenerated"))
+    assert client.get("/upload/", params={"document_id": document_id}).json() == {"summary": "A short summary."}
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from workers import PoolBusyError, WorkerPool
+
+
+def test_full_pool_rejects_instead_of_queueing():
+    pool = WorkerPool("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolBusyError) as rejected:
+            await pool.run(lambda: "rejected")
+        release.set()
+        return rejected.value, await running, await queued
+
+    error, first, second = asyncio.run(scenario())
+    assert error.pool_name == "test"
+    assert error.retry_after >= 1
+    assert (first, second) == (True, "queued")
+    stats = pool.get_stats()
+    assert (stats["completed"], stats["rejected"], stats["queued"]) == (2, 1, 0)
+
+
+def test_retry_after_scales_with_queue_depth_and_task_duration():
+    pool = WorkerPool("test", max_workers=2, max_queue=8)
+    pool.average_seconds = 3.0
+    pool.pending = 6
+    assert pool.retry_after() == 9
+    pool.pending = 0
+    assert pool.retry_after() == 1
+
+
+def test_busy_pool_answers_429_with_retry_after(monkeypatch):
+    busy = WorkerPool("summarize", max_workers=1, max_queue=0)
+    busy.pending = 1
+    busy.average_seconds = 5.0
+    monkeypatch.setitem(main.pools, "summarize", busy)
+
+    client = TestClient(main.app)
+    uploaded = client.post("/upload/", files={"file": ("busy.txt", b"a document that is waiting for a summary slot to free up.")})
+    response = client.get("/upload/", params={"document_id": uploaded.json()["document_id"]})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert response.json()["pool"] == "summarize"
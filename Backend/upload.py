@@ -3,26 +3,57 @@ import state
 import hashlib
 import time
 import logging
-from pdfminer.high_level import extract_text
-from transformers import pipeline
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from extraction import iter_pdf_pages
+from chunking import iter_packed_chunks, pack_texts
+from stores import ExtractionStore, SharedCache
+from models import ModelHandle
+from inference import get_model_variant, optimize_seq2seq
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load model once at module level
-try:
-    logger.info("Loading summarization model...")
-    summarizer = pipeline("summarization", model="t5-small")
-    logger.info("Summarization model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load summarization model: {e}")
-    summarizer = None
+SUMMARIZER_MODEL_NAME = "t5-small"
+
+# Map-reduce summarization settings
+SUMMARY_CHUNK_TOKENS = 480  # t5-small reads 512 tokens, minus the "summarize: " prefix
+SUMMARY_BATCH_SIZE = 8
+SUMMARY_WORKERS = 2  # batches generated concurrently
+PARTIAL_SUMMARY_MAX_LENGTH = 120
+PARTIAL_SUMMARY_MIN_LENGTH = 30
+SUMMARY_MAX_LENGTH = 150
+SUMMARY_MIN_LENGTH = 100
+MAX_CHUNK_SUMMARIES = 20000
+SUMMARY_UNAVAILABLE = "Summarization model not available."
+UNCACHEABLE_SUMMARIES = (SUMMARY_UNAVAILABLE, "Please upload a document first.", "File not found.")  # transient, never cached
+
+def is_cacheable_summary(summary):
+    """Summaries are cached unless the model, the file or the summarizer run failed"""
+    return summary not in UNCACHEABLE_SUMMARIES and not summary.startswith("Error")
+
+def load_summarizer():
+    from transformers import pipeline
+    summarizer = pipeline("summarization", model=SUMMARIZER_MODEL_NAME)
+    summarizer.model = optimize_seq2seq(summarizer.model)
+    return summarizer
+
+# Loaded on first use or by the warm-up in main.py
+summarizer_handle = ModelHandle("summarizer", load_summarizer)
 
-# Cache for extracted text
+# Summaries of chunks (and of reduce groups) by content hash, shared by all workers
+chunk_summary_cache = SharedCache("chunk_summaries", state.cache_store, MAX_CHUNK_SUMMARIES)
+
+# Cache for extracted text (in-process, backed by the persistent store)
 text_cache = {}
 MAX_CACHE_SIZE = 50
 
+try:
+    extraction_store = ExtractionStore()
+except Exception as e:
+    logger.error(f"Failed to open extraction store: {e}")
+    extraction_store = None
+
 def get_file_stats_key(file_path):
     """Generate a cache key based on file path and modification time"""
     try:
@@ -40,9 +71,29 @@ def cleanup_text_cache():
         text_cache.clear()
         text_cache.update(items[-MAX_CACHE_SIZE:])
 
-# Extract text from the uploaded file
-def get_extracted_text():
-    file_path = state.uploaded_file_path
+def load_stored_pages(document_id):
+    """Pages of a previously extracted document from the persistent store, or None"""
+    if not extraction_store or not document_id:
+        return None
+    try:
+        return extraction_store.get_pages(document_id)
+    except Exception as e:
+        logger.error(f"Error reading extraction store: {e}")
+        return None
+
+def save_stored_pages(document_id, pages):
+    """Persist extracted pages so other workers and restarts skip pdfminer"""
+    if not extraction_store or not document_id:
+        return
+    try:
+        extraction_store.put(document_id, pages)
+    except Exception as e:
+        logger.error(f"Error writing extraction store: {e}")
+
+# Extract text from the uploaded file (defaults to the most recent upload)
+def get_extracted_text(file_path=None):
+    if file_path is None:
+        file_path = state.get_uploaded_file_path()
     if not file_path:
         return "No file uploaded yet."
     
@@ -59,13 +110,25 @@ def get_extracted_text():
         logger.info(f"Text extraction cache hit for {os.path.basename(file_path)}")
         return text_cache[cache_key]
     
+    # Check the persistent store (shared across workers and restarts)
+    document_id = state.document_registry.get_document_id(file_path)
+    pages = load_stored_pages(document_id)
+    if pages is not None:
+        text = "".join(pages)
+        text_cache[cache_key] = text
+        cleanup_text_cache()
+        logger.info(f"Text extraction store hit for {os.path.basename(file_path)}")
+        return text
+    
     # Extract text
     start_time = time.time()
     try:
         ext = os.path.splitext(file_path)[-1].lower()
 
         if ext == ".pdf":
-            text = extract_text(file_path)
+            pages = [page["text"] for page in iter_pdf_pages(file_path)]
+            save_stored_pages(document_id, pages)
+            text = "".join(pages)
         elif ext == ".txt":
             with open(file_path, "r", encoding="utf-8") as f:
                 text = f.read()
@@ -86,33 +149,158 @@ def get_extracted_text():
         return f"Error extracting text: {str(e)}"
 
 
-# Generate a summary (max 150 words)
-def generate_summary():
+def get_document_text(session):
+    """Extracted text of a document session, kept on the session once extracted"""
+    if session.text is None:
+        text = get_extracted_text(session.file_path)
+        if text in ("No file uploaded yet.", "File not found.", "Unsupported file format.") or text.startswith("Error"):
+            return text
+        session.text = text
+    return session.text
+
+def iter_document_pages(session):
+    """
+    Yield the text of a document session page by page.
+
+    PDFs are streamed from the parallel extractor so callers can start
+    chunking and embedding early pages while later ones are still parsing;
+    the full text is kept on the session and in the text cache afterwards.
+    Text files and already-extracted documents are yielded as one page.
+    """
+    if session.text is not None or os.path.splitext(session.file_path)[-1].lower() != ".pdf":
+        text = get_document_text(session)
+        if session.text is not None:
+            yield text
+        return
+
+    cache_key = get_file_stats_key(session.file_path)
+    if cache_key in text_cache:
+        session.text = text_cache[cache_key]
+        yield session.text
+        return
+
+    stored_pages = load_stored_pages(session.document_id)
+    if stored_pages is not None:
+        logger.info(f"Text extraction store hit for {session.document_id}")
+        yield from stored_pages
+        session.text = "".join(stored_pages)
+    else:
+        pages = []
+        for page in iter_pdf_pages(session.file_path):
+            pages.append(page["text"])
+            yield page["text"]
+        save_stored_pages(session.document_id, pages)
+        session.text = "".join(pages)
+
+    if cache_key:
+        text_cache[cache_key] = session.text
+        cleanup_text_cache()
+
+def get_summary_key(text, max_length, min_length):
+    """Cache key of a summary: model, backend, length limits and input text"""
+    key = f"{SUMMARIZER_MODEL_NAME}{get_model_variant()}\0{max_length}\0{min_length}\0{text}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def summarize_texts(texts, max_length, min_length):
+    """
+    Summarize texts, yielding (position, summary) as results become available.
+
+    Cached summaries are yielded first; the rest are generated in batches of
+    SUMMARY_BATCH_SIZE on SUMMARY_WORKERS threads and cached by content hash.
+    """
+    summarizer = summarizer_handle.get()
+    keys = [get_summary_key(text, max_length, min_length) for text in texts]
+
+    missing = []
+    for position, key in enumerate(keys):
+        cached = chunk_summary_cache.get(key)
+        if cached is not None:
+            yield position, cached
+        else:
+            missing.append(position)
+
+    def summarize_batch(batch):
+        outputs = summarizer(
+            [texts[i] for i in batch],
+            max_length=max_length, min_length=min_length,
+            do_sample=False, truncation=True, batch_size=len(batch)
+        )
+        return batch, [output['summary_text'] for output in outputs]
+
+    batches = [missing[start:start + SUMMARY_BATCH_SIZE] for start in range(0, len(missing), SUMMARY_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        for future in as_completed([executor.submit(summarize_batch, batch) for batch in batches]):
+            batch, summaries = future.result()
+            for position, summary in zip(batch, summaries):
+                chunk_summary_cache[keys[position]] = summary
+                yield position, summary
+
+def iter_summary_stages(text):
+    """
+    Map-reduce summary of a whole document.
+
+    The text is packed into SUMMARY_CHUNK_TOKENS chunks that are summarized
+    in parallel batches (map); the partial summaries are re-packed and
+    summarized again until they fit one chunk (reduce), which gets the
+    final summary. Yields ("map", {"done", "total", "summary"}) as chunk
+    summaries finish, ("reduce", {"level", "parts"}) per reduce round and
+    ("final", summary) last.
+    """
+    tokenizer = summarizer_handle.get().tokenizer
+    parts = list(iter_packed_chunks([text], tokenizer, SUMMARY_CHUNK_TOKENS)) or [text]
+
+    level = 0
+    while len(parts) > 1:
+        summaries = [None] * len(parts)
+        for done, (position, summary) in enumerate(summarize_texts(parts, PARTIAL_SUMMARY_MAX_LENGTH, PARTIAL_SUMMARY_MIN_LENGTH), 1):
+            summaries[position] = summary
+            if level == 0:
+                yield "map", {"done": done, "total": len(parts), "summary": summary}
+        level += 1
+        parts = list(pack_texts(summaries, tokenizer, SUMMARY_CHUNK_TOKENS))
+        yield "reduce", {"level": level, "parts": len(parts)}
+
+    _, summary = next(summarize_texts(parts, SUMMARY_MAX_LENGTH, SUMMARY_MIN_LENGTH))
+    yield "final", summary
+
+def iter_document_summary(session):
+    """
+    Summary stages of a document session (see iter_summary_stages).
+
+    Always ends with ("final", text); when no summary can be produced the
+    only stage is ("final", message).
+    """
+    summarizer = summarizer_handle.get()
     if not summarizer:
-        return "Summarization model not available."
+        yield "final", SUMMARY_UNAVAILABLE
+        return
     
-    text = get_extracted_text()
+    text = get_document_text(session)
     
     if text == "No file uploaded yet.":
-        return "Please upload a document first."
+        yield "final", "Please upload a document first."
+        return
     
-    if text.startswith("Error"):
-        return text
+    if text == "File not found." or text.startswith("Error"):
+        yield "final", text
+        return
     
     # Handle empty or very short text
     if len(text.strip()) < 50:
-        return "Document is too short to generate a meaningful summary."
-
-    # Truncate very long text for the model
-    if len(text) > 1000:
-        text = text[:1000] + "..."
+        yield "final", "Document is too short to generate a meaningful summary."
+        return
 
     try:
         start_time = time.time()
-        summary = summarizer(text, max_length=150, min_length=100, do_sample=False)
+        yield from iter_summary_stages(text)
         end_time = time.time()
         logger.info(f"Summary generated in {end_time - start_time:.2f} seconds")
-        return summary[0]['summary_text']
     except Exception as e:
         logger.error(f"Error generating summary: {e}")
-        return f"Error generating summary: {str(e)}"
+        yield "final", f"Error generating summary: {str(e)}"
+
+# Generate a summary (max 150 words) of the whole document
+def generate_summary(session):
+    for stage, result in iter_document_summary(session):
+        if stage == "final":
+            return result
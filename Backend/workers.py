@@ -0,0 +1,253 @@
+"""
+Bounded worker pools for model inference.
+
+Each model class (embedding, extractive QA, summarization, question
+generation) gets its own small thread pool, so a slow summary never
+occupies the threads that answer questions, and the event loop stays free
+for cache hits. Every pool accepts at most `max_workers + max_queue` tasks;
+beyond that `run` raises PoolBusyError and the API answers 429 with a
+Retry-After estimated from recent task durations. `iterate` runs a
+generator on a pool and hands its items to a streaming response.
+
+MicroBatcher sits in front of models that are cheap per item but costly
+per call (question encoding, extractive QA): concurrent requests are
+collected for a few milliseconds and run as one batch.
+"""
+
+import time
+import asyncio
+import logging
+import queue
+import threading
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (max_workers, max_queue) per model class
+POOL_SIZES = {
+    "embed": (2, 32),
+    "qa": (2, 32),
+    "summarize": (1, 4),
+    "question_generation": (1, 4),
+}
+DURATION_SMOOTHING = 0.2  # weight of the latest task in the moving average
+BATCH_MAX_WAIT_MS = 5  # how long a batch stays open for more requests
+BATCH_MAX_SIZE = 32
+BATCH_MAX_QUEUE = 256
+
+
+class PoolBusyError(Exception):
+    """Raised when a worker pool's queue is full"""
+
+    def __init__(self, pool_name, retry_after):
+        super().__init__(f"{pool_name} worker pool is busy, retry in {retry_after}s")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """A fixed-size thread pool with a bounded queue and load counters"""
+
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.average_seconds = 0.0
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up (at least 1)"""
+        waves = self.pending / self.max_workers
+        return max(1, round(waves * self.average_seconds))
+
+    def reserve(self):
+        """Take a queue slot, or raise PoolBusyError if the queue is full"""
+        with self.lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolBusyError(self.name, self.retry_after())
+            self.pending += 1
+
+    def release(self, *_):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool, or raise PoolBusyError if the queue is full"""
+        self.reserve()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, partial(self.execute, fn, *args, **kwargs))
+        finally:
+            self.release()
+
+    def iterate(self, fn, *args, **kwargs):
+        """
+        Run a generator function on the pool and return an async iterator of its items.
+
+        The slot is taken (or PoolBusyError raised) immediately, so handlers can
+        still answer 429 before a streaming response starts. The generator runs
+        to completion even if the consumer goes away, so its side effects
+        (caches) are not lost.
+        """
+        self.reserve()
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        finished = object()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, finished)
+
+        future = loop.run_in_executor(self.executor, partial(self.execute, produce))
+        future.add_done_callback(self.release)
+
+        async def consume():
+            while True:
+                item = await items.get()
+                if item is finished:
+                    break
+                yield item
+            await future  # re-raise an exception from the generator
+
+        return consume()
+
+    def execute(self, fn, *args, **kwargs):
+        """Worker-thread side of `run`: time the task and update counters"""
+        with self.lock:
+            self.running += 1
+        start_time = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start_time
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+                if self.completed == 1:
+                    self.average_seconds = seconds
+                else:
+                    self.average_seconds += DURATION_SMOOTHING * (seconds - self.average_seconds)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_seconds": round(self.average_seconds, 4)
+            }
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item requests into batched model calls.
+
+    `batch_fn` takes a list of items and returns one result per item. A
+    dedicated thread (started on first use) takes the first waiting item,
+    keeps the batch open for up to `max_wait_ms` or until `max_batch_size`
+    items are collected, runs `batch_fn` once and resolves every caller's
+    future. Use max_batch_size=1 to disable coalescing.
+    """
+
+    def __init__(self, name, batch_fn, max_wait_ms=BATCH_MAX_WAIT_MS, max_batch_size=BATCH_MAX_SIZE, max_queue=BATCH_MAX_QUEUE):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.average_seconds = 0.0
+        batchers[name] = self
+
+    def submit(self, item):
+        """Queue an item; returns a Future resolved with its result"""
+        with self.lock:
+            if self.queue.qsize() >= self.max_queue:
+                self.rejected += 1
+                raise PoolBusyError(self.name, max(1, round(self.average_seconds * self.queue.qsize() / self.max_batch_size)))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, name=f"{self.name}-batcher", daemon=True)
+                self.thread.start()
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    async def run(self, item):
+        """Awaitable form of `submit` for async handlers"""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def collect(self):
+        """Block for the first item, then gather more until the wait or size limit"""
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        while True:
+            batch = self.collect()
+            start_time = time.perf_counter()
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            seconds = time.perf_counter() - start_time
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+                if self.batches == 1:
+                    self.average_seconds = seconds
+                else:
+                    self.average_seconds += DURATION_SMOOTHING * (seconds - self.average_seconds)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "batches": self.batches,
+                "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "rejected": self.rejected,
+                "average_seconds": round(self.average_seconds, 4)
+            }
+
+
+pools = {name: WorkerPool(name, max_workers, max_queue) for name, (max_workers, max_queue) in POOL_SIZES.items()}
+batchers = {}  # MicroBatcher instances register themselves by name
+
+def get_pool_stats():
+    """Queue depth and throughput counters for every pool and micro-batcher"""
+    stats = {name: pool.get_stats() for name, pool in pools.items()}
+    stats.update({f"{name}_batcher": batcher.get_stats() for name, batcher in batchers.items()})
+    return stats